@@ -53,5 +53,6 @@ class ESGComplianceCdkStack(Stack):
                 secret = cognito_stack.idpSecrets,
                 report_bucket=report_stack.report_bucket,
                 gradings_bucket=report_stack.gradings_bucket,
+                status_table=report_stack.status_table,
                 identity_pool=cognito_stack.identity_pool
                 )
\ No newline at end of file
@@ -23,7 +23,8 @@ from aws_cdk import (
     aws_cognito as cognito,
     aws_secretsmanager as secrets,
     aws_certificatemanager as acm,
-    aws_s3 as s3
+    aws_s3 as s3,
+    aws_dynamodb as ddb
 )
 
 
@@ -41,6 +42,7 @@ class CoreNetwork(Construct):
                  secret: secrets.ISecret,
                  report_bucket: s3.IBucket,
                  gradings_bucket: s3.IBucket,
+                 status_table: ddb.ITable,
                  **kwargs):
         super().__init__(scope, id)
         
@@ -157,7 +159,8 @@ class CoreNetwork(Construct):
                 "AWS_REGION": cdk.Stack.of(self).region,
                 "AWS_ACCOUNT_ID": cdk.Stack.of(self).account,
                 "REPORT_BUCKET": report_bucket.bucket_name,
-                "GRADING_BUCKET": gradings_bucket.bucket_name
+                "GRADING_BUCKET": gradings_bucket.bucket_name,
+                "STATUS_TABLE": status_table.table_name
             },
             logging=ecs.LogDrivers.aws_logs(stream_prefix="WebContainerLogs"))
 
@@ -186,6 +189,7 @@ class CoreNetwork(Construct):
         
         task_role = fargate_task_definition.task_role
         task_role.attach_inline_policy(bedrock_policy)
+        status_table.grant_read_data(task_role)
         
         secret.grant_read(task_role)
         
@@ -46,7 +46,13 @@ class ReportUpload(Construct):
             enforce_ssl=True,
             removal_policy=RemovalPolicy.DESTROY,
             auto_delete_objects=True,
-            event_bridge_enabled=True
+            event_bridge_enabled=True,
+            # cached LLM responses are ignored after LLM_CACHE_TTL_DAYS, clear them out;
+            # Textract results never go stale, keep them while a report is likely to be re-run
+            lifecycle_rules=[
+                s3.LifecycleRule(prefix="llm-cache/", expiration=Duration.days(30)),
+                s3.LifecycleRule(prefix="textract-cache/", expiration=Duration.days(90))
+            ]
         )
         
         #Create S3 bucket to store gradings
@@ -109,6 +115,35 @@ class ReportUpload(Construct):
             
         )
     
+        #Table to store pipeline progress per import, read by the upload page
+        self.status_table = ddb.Table(
+            self,
+            f"{prefix}-status-table",
+            partition_key=ddb.Attribute(
+                name='Import Uid',
+                type=ddb.AttributeType.STRING
+            ),
+            sort_key=ddb.Attribute(
+                name='Record',
+                type=ddb.AttributeType.STRING
+            ),
+            removal_policy=RemovalPolicy.DESTROY
+            
+        )
+        # per-stage latency across imports, e.g. every "nc" record started this week
+        self.status_table.add_global_secondary_index(
+            index_name="stage-index",
+            partition_key=ddb.Attribute(
+                name='Stage',
+                type=ddb.AttributeType.STRING
+            ),
+            sort_key=ddb.Attribute(
+                name='Started At',
+                type=ddb.AttributeType.STRING
+            )
+        )
+        status_table = self.status_table
+    
         #Loop to form lambda function constructs and layers
         layer_keys = [d for d in os.listdir("lambda_layers") if os.path.isdir(os.path.join("lambda_layers", d))]
         layers = dict(zip(
@@ -199,6 +234,13 @@ class ReportUpload(Construct):
             )
         )
         
+        lambdas["validate_unrated_issues"].add_to_role_policy(
+            iam.PolicyStatement(
+                actions=["s3:GetObject", "s3:ListBucket"],
+                resources=[f"{gradings_bucket.bucket_arn}/*",gradings_bucket.bucket_arn]
+            )
+        )
+        
         lambdas["get_nc"].add_to_role_policy(
             iam.PolicyStatement(
                 actions=["dynamodb:*"],
@@ -276,6 +318,29 @@ class ReportUpload(Construct):
             )
         )
         
+        lambdas["upload_grading"].add_to_role_policy(
+            iam.PolicyStatement(
+                actions=["bedrock:InvokeModel"],
+                resources=["*"]
+            )
+        )
+        
+        for lambda_key in ["report_split", "bedrock_supplier_extraction", "extract_nc", "validate_unrated_issues", "get_nc", "generate_email", "status_events"]:
+            lambdas[lambda_key].add_to_role_policy(
+                iam.PolicyStatement(
+                    actions=["dynamodb:PutItem", "dynamodb:UpdateItem"],
+                    resources=[status_table.table_arn]
+                )
+            )
+        
+        # status_events fails the stages a failed execution left running
+        lambdas["status_events"].add_to_role_policy(
+            iam.PolicyStatement(
+                actions=["dynamodb:Query"],
+                resources=[status_table.table_arn]
+            )
+        )
+        
         gradings_bucket.add_event_notification(s3.EventType.OBJECT_CREATED, s3n.LambdaDestination(lambdas["upload_grading"]), s3.NotificationKeyFilter(prefix='gradings/'))
         
         
@@ -283,13 +348,20 @@ class ReportUpload(Construct):
         lambdas["bedrock_supplier_extraction"].add_environment('SUPPLIER_TABLE', supplier_table.table_name)
         lambdas["extract_nc"].add_environment('SUPPLIER_TABLE', supplier_table.table_name)
         lambdas["extract_nc"].add_environment('GRADINGS_TABLE', compliance_grading_table.table_name)
+        lambdas["extract_nc"].add_environment('GRADINGS_BUCKET', gradings_bucket.bucket_name)
         lambdas["get_nc"].add_environment('SUPPLIER_TABLE', supplier_table.table_name)
         lambdas["validate_unrated_issues"].add_environment('GRADINGS_TABLE', compliance_grading_table.table_name)
         lambdas["validate_unrated_issues"].add_environment('SUPPLIER_TABLE', supplier_table.table_name)
+        lambdas["validate_unrated_issues"].add_environment('GRADINGS_BUCKET', gradings_bucket.bucket_name)
         lambdas["send_emails"].add_environment('TOPIC_ARN', sns_topic.topic_arn)
         lambdas["send_emails"].add_environment('SUPPLIER_TABLE', supplier_table.table_name)
         lambdas["generate_email"].add_environment('SUPPLIER_TABLE', supplier_table.table_name)
         lambdas["upload_grading"].add_environment('GRADINGS_TABLE', compliance_grading_table.table_name)
+        for lambda_key in ["report_split", "bedrock_supplier_extraction", "extract_nc", "validate_unrated_issues", "get_nc", "generate_email", "status_events"]:
+            lambdas[lambda_key].add_environment('STATUS_TABLE', status_table.table_name)
+        for lambda_key in ["bedrock_supplier_extraction", "supplier_details", "extract_nc"]:
+            lambdas[lambda_key].add_environment('TEXTRACT_CACHE_BUCKET', report_bucket.bucket_name)
+            lambdas[lambda_key].add_environment('LLM_CACHE_BUCKET', report_bucket.bucket_name)
         
         #Create state machine
         report_split_job = tasks.LambdaInvoke(
@@ -525,6 +597,21 @@ class ReportUpload(Construct):
         
         put_report_rule.add_target(targets.SfnStateMachine(state_machine))
         
+        #Mirror execution status changes into the status table
+        execution_status_rule = events.Rule(
+            self,
+            f"{prefix}-execution-status-rule",
+            event_pattern=events.EventPattern(
+                source=["aws.states"],
+                detail_type=["Step Functions Execution Status Change"],
+                detail={
+                    "stateMachineArn": [state_machine.state_machine_arn]
+                }
+            )
+        )
+        
+        execution_status_rule.add_target(targets.LambdaFunction(lambdas["status_events"]))
+        
         lambdas["email_approved"].add_to_role_policy(
             iam.PolicyStatement(
                 actions=["states:sendTaskSuccess"],
@@ -2,16 +2,23 @@ import json
 import logging
 import os
 
+import boto3
+
 logger = logging.getLogger(__file__)
 logger.setLevel(logging.INFO)
 
 from modules.bedrock_extraction import supplier_extract
 from modules.dynamo_upload import create_audit_record
+from modules.progress import ProgressRecorder, import_uid_from_uri
+
+progress = ProgressRecorder(boto3.client('dynamodb'), os.getenv("STATUS_TABLE"))
 
+@progress.reports_failures
 def handler(event, context):
     logger.info(f"request: {json.dumps(event)}")
     
     supplier_uri = event["supplier_uri"]
+    run = progress.start(import_uid_from_uri(supplier_uri), "supplier")
     
     logger.info(f"Getting supplier details from:\n {supplier_uri}")
     supplier_details = supplier_extract(supplier_uri)
@@ -21,6 +28,7 @@ def handler(event, context):
     logger.info(f"Uploading supplier details to dynamodb:\n {supplier_details}")
     response = create_audit_record(supplier_dict=supplier_details, table_name=table_name)
     logger.info(f"Dynamodb response:\n {response}")
+    progress.finish(run, counts={"fields": len(supplier_details)})
     
     return {
         "supplier_uri": event["supplier_uri"],
@@ -1,20 +1,47 @@
+from concurrent.futures import Future, ThreadPoolExecutor
 import json
 import logging
+import os
 import re
-from typing import List, Dict
+import threading
+from typing import Callable, List, Dict
 
 import boto3
+from botocore.config import Config
 from textractor import Textractor
 from textractor.data.constants import TextractFeatures
+from textractor.entities.document import Document
 from textractor.data.text_linearization_config import TextLinearizationConfig
 import yaml
 
 from modules import partition_keys
 from modules.tables import audit_table_factory
+from modules.term_matcher import TermMatcher
+from modules.llm_cache import s3_llm_cache
+from modules.textract_cache import TextractCache
 
 logger = logging.getLogger(__file__)
 logger.setLevel(logging.INFO)
 
+HAIKU_MODEL_ID = "anthropic.claude-3-haiku-20240307-v1:0"
+SONNET_MODEL_ID = "us.anthropic.claude-3-7-sonnet-20250219-v1:0"
+
+# bound on in-flight extraction calls, and on in-flight calls per model
+BEDROCK_MAX_WORKERS = int(os.getenv("BEDROCK_MAX_WORKERS", "8"))
+MODEL_SEMAPHORES = {
+    HAIKU_MODEL_ID: threading.BoundedSemaphore(int(os.getenv("BEDROCK_HAIKU_CONCURRENCY", "4"))),
+    SONNET_MODEL_ID: threading.BoundedSemaphore(int(os.getenv("BEDROCK_SONNET_CONCURRENCY", "2"))),
+}
+# "per_table" sends one Haiku request per table, "combined" sends every table in one request
+EXTRACTION_MODE = os.getenv("EXTRACTION_MODE", "per_table").lower()
+# adaptive mode retries throttling errors with backoff and rate limits the client while throttled
+BEDROCK_CONFIG = Config(
+    retries={"max_attempts": int(os.getenv("BEDROCK_MAX_ATTEMPTS", "8")), "mode": "adaptive"},
+    max_pool_connections=BEDROCK_MAX_WORKERS,
+)
+textract_cache = TextractCache(s3_client=boto3.client("s3"), bucket=os.getenv("TEXTRACT_CACHE_BUCKET"))
+llm_cache = s3_llm_cache(boto3.client("s3"), os.getenv("LLM_CACHE_BUCKET"), ttl_days=float(os.getenv("LLM_CACHE_TTL_DAYS", "30")))
+
 def validate_table(table, structure: dict) -> bool:
     if all(value is None for value in structure.values()):
         raise ValueError("Table structure is empty, please alter config and include some way of identifying the table")
@@ -136,13 +163,21 @@ def get_bedrock_tables(tables):
 
 def find_missing_data(pages, missing_tables) -> dict:
     found_pages = {}
+    if not missing_tables:
+        return found_pages
+    
+    matcher = TermMatcher(
+        term
+        for obj in missing_tables.values()
+        for term in obj["structure"]["key_terms"] or []
+    )
+    postings = matcher.index([page.get_text().lower() for page in pages])
     for table, obj in missing_tables.items():
-        key_terms = obj["structure"]["key_terms"]
-        for page in pages:
-            text = page.get_text().lower()
-            if any(term in text for term in key_terms):
-                found_pages[table] = page.to_markdown()
-                logger.info(f"Found data for table <{table}>")
+        hits = TermMatcher.match_any(postings, obj["structure"]["key_terms"])
+        if hits:
+            # the last matching page wins, as when every page was checked in turn
+            found_pages[table] = pages[hits[-1]].to_markdown()
+            logger.info(f"Found data for table <{table}> on pages {hits}")
     if non_findable := set(missing_tables.keys()) - set(found_pages.keys()):
         logger.info(f"Still missing data for the following tables, please reconsider their configuration:\n{non_findable}")
         
@@ -161,6 +196,25 @@ def parse_response(response: str) -> dict:
     return data
 
 
+def invoke_model(body: str, model_id: str, bedrock_runtime) -> str:
+    with MODEL_SEMAPHORES[model_id]:
+        response = llm_cache.invoke_model(
+            bedrock_runtime,
+            body=body,
+            modelId=model_id,
+            accept="application/json",
+            contentType="application/json",
+        )
+    return response['content'][0]['text']
+
+
+def submit_extractions(executor: ThreadPoolExecutor, inputs: Dict[str, str], extract: Callable, config: dict, bedrock_runtime) -> Dict[str, Future]:
+    return {
+        name: executor.submit(extract, data, config[name]["queries"], bedrock_runtime)
+        for name, data in inputs.items()
+    }
+
+
 def haiku_extract_from_table(table: str, queries: List[str], bedrock_runtime) -> Dict[str,str]:
     prompt = """You are a validation step in a data-science process, your responses should be consistent and reliable.
 Your task is to analyze the markdown tables provided to you and extract any information the user asks for as a key value pair.
@@ -196,16 +250,92 @@ Here is the table you must reference when responding to the information request:
         "top_p": 0.1
     })
     
-    response = bedrock_runtime.invoke_model(
-        body=body,
-        modelId="anthropic.claude-3-haiku-20240307-v1:0",
-        accept="application/json",
-        contentType="application/json",
-    )
-    text = json.loads(response['body'].read())['content'][0]['text']
+    text = invoke_model(body, HAIKU_MODEL_ID, bedrock_runtime)
     # write function to catch a parse error and store the table somewhere
     return parse_response(text)
 
+def haiku_extract_from_tables(tables: Dict[str, str], table_queries: Dict[str, List[str]], bedrock_runtime) -> Dict[str, Dict[str,str]]:
+    prompt = """You are a validation step in a data-science process, your responses should be consistent and reliable.
+Your task is to analyze the markdown tables provided to you and extract any information the user asks for as key value pairs.
+Each table is enclosed in <table name="..."></table> tags and the user will tell you which information to extract from which table.
+You should look through each table and consider its structure.  Some tables may have multi-hierarchical structures, others may be simple.
+Your response should be in the following format enclosed in <response></response> tags, with one object per table name:
+
+<response>
+{
+    table1: {
+        key1: value1,
+        key2: value2,
+        ...
+    },
+    ...
+}
+</response>
+
+Here are the tables you must reference when responding to the information request:"""
+
+    for name, table in tables.items():
+        prompt += f'\n\n<table name="{name}">\n{table}\n</table>'
+
+    request = '\n'.join(f"{name}: {', '.join(table_queries[name])}" for name in tables)
+
+    body = json.dumps({
+        "anthropic_version": "bedrock-2023-05-31",
+        "system": prompt,
+        "messages": [
+            {
+                "role": "user",
+                "content": [
+                    {"type": "text", "text": request}
+                ]
+            }
+        ],
+        "temperature": 0.5,
+        "max_tokens": 4000,
+        "top_k": 100,
+        "top_p": 0.1
+    })
+    
+    text = invoke_model(body, HAIKU_MODEL_ID, bedrock_runtime)
+    return parse_response(text)
+
+
+def missing_queries(data, queries: List[str]) -> List[str]:
+    if not isinstance(data, dict):
+        return list(queries)
+    found = {str(key).lower() for key in data}
+    return [query for query in queries if query.lower() not in found]
+
+
+def extract_tables_combined(executor: ThreadPoolExecutor, markdown_tables: Dict[str, str], config: dict, bedrock_runtime) -> Dict[str, Future]:
+    """
+    Extract every table in one Haiku request, then resubmit only the tables
+    whose keys came back missing as per-table requests
+    """
+    results = {}
+    if markdown_tables:
+        table_queries = {name: config[name]["queries"] for name in markdown_tables}
+        try:
+            response = haiku_extract_from_tables(markdown_tables, table_queries, bedrock_runtime)
+            results = {str(name).lower(): data for name, data in response.items()}
+        except (AttributeError, ValueError) as e:
+            logger.info(f"Could not parse combined table extraction, falling back to per-table requests: {e}")
+
+    futures = {}
+    fallback_tables = {}
+    for name, table in markdown_tables.items():
+        if missing := missing_queries(results.get(name), config[name]["queries"]):
+            logger.info(f"Combined extraction missing {missing} for table <{name}>")
+            fallback_tables[name] = table
+        else:
+            futures[name] = Future()
+            futures[name].set_result(results[name])
+
+    futures.update(submit_extractions(executor, fallback_tables, haiku_extract_from_table, config, bedrock_runtime))
+    # keep the per-table order so merged_dict precedence does not depend on the mode
+    return {name: futures[name] for name in markdown_tables}
+
+
 def sonnet_extract_from_page(page: str, queries: List[str], bedrock_runtime) -> Dict[str,str]:
     prompt = """You are a validation step in a data-science process, your responses should be consistent and reliable.
 Your task is to analyze the markdown page provided to you and extract any information the user asks for as a key value pair.
@@ -241,26 +371,26 @@ Here is the page information you must reference when responding to the informati
         "top_p": 0.1
     })
     
-    response = bedrock_runtime.invoke_model(
-        body=body,
-        modelId="us.anthropic.claude-3-7-sonnet-20250219-v1:0",
-        accept="application/json",
-        contentType="application/json",
-    )
-    text = json.loads(response['body'].read())['content'][0]['text']
+    text = invoke_model(body, SONNET_MODEL_ID, bedrock_runtime)
     # write function to catch a parse error and store the table somewhere
     return parse_response(text)
 
 
 def supplier_extract(supplier_uri: str) -> Dict:
     extractor = Textractor()
-    bedrock_runtime = boto3.client("bedrock-runtime")
+    bedrock_runtime = boto3.client("bedrock-runtime", config=BEDROCK_CONFIG)
 
-    document = extractor.start_document_analysis(
-        file_source=supplier_uri,
-        features=[TextractFeatures.TABLES],
-        save_image=False
+    features = [TextractFeatures.TABLES]
+    textract_response = textract_cache.analyse(
+        document_uri=supplier_uri,
+        features=features,
+        analyse=lambda: extractor.start_document_analysis(
+            file_source=supplier_uri,
+            features=features,
+            save_image=False
+        ).response
     )
+    document = Document.open(textract_response)
     tables = document.tables
     pages = document.pages
     
@@ -278,16 +408,16 @@ def supplier_extract(supplier_uri: str) -> Dict:
     with open('config/bedrock_tables.yaml') as f:
         bedrock_tables = yaml.safe_load(f)
 
-    logger.info("Extracting info from tables")
-    table_query_dict = {
-        name: haiku_extract_from_table(markdown_tables[name], bedrock_tables[name]["queries"], bedrock_runtime)
-        for name in markdown_tables
-    }
-    logger.info("Extracting info from pages")
-    page_query_dict = {
-        name: sonnet_extract_from_page(page_data[name], bedrock_tables[name]["queries"], bedrock_runtime)
-        for name in page_data
-    }
+    logger.info(f"Extracting info from {len(markdown_tables)} tables and {len(page_data)} pages")
+    with ThreadPoolExecutor(max_workers=BEDROCK_MAX_WORKERS) as executor:
+        page_futures = submit_extractions(executor, page_data, sonnet_extract_from_page, bedrock_tables, bedrock_runtime)
+        if EXTRACTION_MODE == "combined":
+            table_futures = extract_tables_combined(executor, markdown_tables, bedrock_tables, bedrock_runtime)
+        else:
+            table_futures = submit_extractions(executor, markdown_tables, haiku_extract_from_table, bedrock_tables, bedrock_runtime)
+        # collect in submission order so merged_dict precedence matches the sequential version
+        table_query_dict = {name: future.result() for name, future in table_futures.items()}
+        page_query_dict = {name: future.result() for name, future in page_futures.items()}
     
     merged_dict = {}
     for page_info in page_query_dict.values():
@@ -1,14 +1,85 @@
 from datetime import datetime
+from functools import lru_cache
 import json
+import logging
+import os
 import re
+from typing import Optional
 
 import boto3
 
+from modules.llm_cache import s3_llm_cache
+
+logger = logging.getLogger(__file__)
+logger.setLevel(logging.INFO)
+
+llm_cache = s3_llm_cache(boto3.client('s3'), os.getenv('LLM_CACHE_BUCKET'), ttl_days=float(os.getenv('LLM_CACHE_TTL_DAYS', '30')))
+
+# SMETA reports write dates day first
+DATE_FORMATS = [
+    "%d/%m/%Y", "%d/%m/%y", "%d.%m.%Y", "%d.%m.%y", "%d-%m-%Y", "%d-%m-%y",
+    "%d %B %Y", "%d %b %Y", "%d %B %y", "%d %b %y",
+    "%d-%b-%Y", "%d-%b-%y", "%d-%B-%Y", "%d/%b/%Y", "%d/%b/%y",
+    "%B %d %Y", "%b %d %Y", "%Y-%m-%d", "%Y/%m/%d",
+]
+ORDINAL_PATTERN = re.compile(r"(?<=\d)(st|nd|rd|th)\b")
+# "06-07/03/2024" or "6th & 7th March 2024", keep the first day of the audit
+DAY_RANGE_PATTERN = re.compile(r"^(\d{1,2})\s*(?:-|&|and|to)\s*\d{1,2}(?=[/.\- ])")
+# "06/03/2024 - 07/03/2024" or "6 March to 7 March 2024"
+DATE_RANGE_PATTERN = re.compile(r"\s+(?:-|to|&|and)\s+")
+YEAR_PATTERN = re.compile(r"\b(\d{4})$")
+
 def format_company_name(company_name: str) -> str:
     name = re.sub(r'[^a-zA-Z0-9]', ' ', company_name)
     return re.sub(r' +', ' ', name)
     
+def normalise_date_string(date_string: str) -> str:
+    text = date_string.strip().lower().replace(",", " ").replace("\u2013", "-").replace("\u2014", "-")
+    text = ORDINAL_PATTERN.sub("", text)
+    text = re.sub(r"\bsept\b", "sep", text)
+    text = re.sub(r"\s*([/.])\s*", r"\1", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+def parse_single_date(text: str) -> Optional[str]:
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, date_format).date().isoformat()
+        except ValueError:
+            continue
+    return None
+
+@lru_cache(maxsize=256)
+def parse_audit_date(date_string: str) -> Optional[str]:
+    """
+    Parse the date formats SMETA reports use into ISO 8601 (YYYY-MM-DD),
+    taking the first day of a date range. Returns None when the format is not recognised.
+    """
+    text = normalise_date_string(date_string)
+    if date := parse_single_date(text):
+        return date
+
+    text = DAY_RANGE_PATTERN.sub(r"\1", text)
+    if date := parse_single_date(text):
+        return date
+
+    parts = DATE_RANGE_PATTERN.split(text)
+    if len(parts) > 1:
+        if date := parse_single_date(parts[0]):
+            return date
+        # "6 March - 7 March 2024" only gives the year once
+        if year := YEAR_PATTERN.search(parts[-1]):
+            return parse_single_date(f"{parts[0]} {year.group(1)}")
+    return None
+
 def format_audit_date(date_string: str) -> str:
+    if isinstance(date_string, str) and (date := parse_audit_date(date_string)):
+        return date
+
+    logger.info(f"Could not parse audit date '{date_string}' locally, asking the LLM")
+    return llm_format_audit_date(date_string)
+
+@lru_cache(maxsize=256)
+def llm_format_audit_date(date_string: str) -> str:
     bedrock_runtime = boto3.client('bedrock-runtime')
     
     prompt = "Tell me what the following date is in ISO 8601 format (YYYY-MM-DD).  You should only respond with the date."
@@ -29,14 +100,15 @@ def format_audit_date(date_string: str) -> str:
         "top_p": 0.1
     })
     
-    response = bedrock_runtime.invoke_model(
+    response = llm_cache.invoke_model(
+        bedrock_runtime,
         body=body,
         modelId="anthropic.claude-3-haiku-20240307-v1:0",
         accept="application/json",
         contentType="application/json",
     )
     
-    date_response = json.loads(response["body"].read())['content'][0]['text']
+    date_response = response['content'][0]['text']
     
     try:
         datetime.fromisoformat(date_response)
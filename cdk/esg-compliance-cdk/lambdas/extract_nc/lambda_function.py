@@ -5,12 +5,18 @@ import boto3
 import pymupdf
 import csv
 import io
-import re
+from concurrent.futures import ThreadPoolExecutor
 from textractcaller.t_call import call_textract, Textract_Features
 from trp.trp2 import TDocument, TDocumentSchema
 from trp.t_pipeline import order_blocks_by_geo
 import trp
-from fuzzywuzzy import fuzz, process
+from modules.batch_writer import BatchItemWriter
+from modules.chunked_textract import analyse_in_chunks
+from modules.grading_catalogue import GradingCatalogue
+from modules.issue_parser import parse_issues
+from modules.llm_cache import s3_llm_cache
+from modules.progress import ProgressRecorder, import_uid_from_uri
+from modules.textract_cache import TextractCache
 
 bedrock_runtime = boto3.client('bedrock-runtime')
 bedrock = boto3.client('bedrock')
@@ -20,44 +26,61 @@ ddb_client = boto3.client('dynamodb')
 
 supplier_table = os.environ['SUPPLIER_TABLE']
 compliance_grading_table = os.environ['GRADINGS_TABLE']
-
-def get_rating(issue_title):
-    
-    response = ddb_client.scan(
-        TableName=compliance_grading_table,
-        FilterExpression='contains(#it, :value)',
-        ExpressionAttributeNames={
-            '#it':'Issue Title'
-        },
-        ExpressionAttributeValues={
-            ':value': {'S':issue_title.strip()}
-        }
-    )
-
-    items = response.get('Items',[])
-    print(items)
-    
-    best_match = None
-    highest_score = 0
-    
-    for item in items:
-        db_issue_title = item.get('Issue Title',{}).get('S','')
-        score = fuzz.partial_ratio(issue_title.lower(),db_issue_title.lower())
-        print(score)
-        if score > highest_score:
-            highest_score = score
-            best_match = item
-    if best_match and highest_score > 80:
-        return best_match
-    else:
-        return None
+# pages per concurrent Textract job for long sections, 0 sends the whole section as one job
+textract_chunk_size = int(os.environ.get('TEXTRACT_CHUNK_SIZE', '0'))
+textract_max_workers = int(os.environ.get('TEXTRACT_MAX_WORKERS', '4'))
+# estimated prompt tokens per get_explanation call, 0 sends the whole section in one call
+explanation_batch_tokens = int(os.environ.get('EXPLANATION_BATCH_TOKENS', '4000'))
+explanation_batch_issues = int(os.environ.get('EXPLANATION_BATCH_ISSUES', '10'))
+explanation_max_workers = int(os.environ.get('EXPLANATION_MAX_WORKERS', '4'))
+
+grading_catalogue = GradingCatalogue(
+    ddb_client=ddb_client,
+    s3_client=s3_client,
+    table_name=compliance_grading_table,
+    bucket=os.environ.get('GRADINGS_BUCKET')
+)
+textract_cache = TextractCache(s3_client=s3_client, bucket=os.environ.get('TEXTRACT_CACHE_BUCKET'))
+progress = ProgressRecorder(ddb_client, os.environ.get('STATUS_TABLE'))
+llm_cache = s3_llm_cache(s3_client, os.environ.get('LLM_CACHE_BUCKET'), ttl_days=float(os.environ.get('LLM_CACHE_TTL_DAYS', '30')))
+
+def clean_issue_title(issue_title):
+    if '-' in issue_title:
+        parts = issue_title.split('-', 1)
+        if parts[0].strip().isdigit():
+            issue_title = parts[1]
+    return issue_title
+
+def get_ratings(issues_list):
+    """
+    Look up the best grading for every non-compliance in the section in one batch,
+    keyed by the issue's position in issues_list
+    """
+    nc_positions = [
+        i for i, item in enumerate(issues_list)
+        if len(item) == 4 and 'non-compliance' in item[0].lower()
+    ]
+    titles = [clean_issue_title(issues_list[i][1]) for i in nc_positions]
+    return dict(zip(nc_positions, grading_catalogue.best_matches(titles)))
     
 
 def order_document(document):
     
 
-    # call textract
-    textract_json = call_textract(input_document=document, features=[Textract_Features.FORMS, Textract_Features.TABLES], boto3_textract_client=textract_client)
+    # call textract, unless this exact section has already been analysed
+    features = [Textract_Features.FORMS, Textract_Features.TABLES]
+    if textract_chunk_size > 0:
+        analyse = lambda: analyse_in_chunks(
+            document_uri=document,
+            features=features,
+            chunk_size=textract_chunk_size,
+            s3_client=s3_client,
+            textract_client=textract_client,
+            max_workers=textract_max_workers
+        )
+    else:
+        analyse = lambda: call_textract(input_document=document, features=features, boto3_textract_client=textract_client)
+    textract_json = textract_cache.analyse(document_uri=document, features=features, analyse=analyse)
     #load unordered document
     t_doc = TDocumentSchema().load(textract_json)
     # the ordered_doc has elements ordered by y-coordinate (top to bottom of page)
@@ -68,96 +91,148 @@ def order_document(document):
    
     return trp_doc
 
-def get_issues_timescale(ordered_doc):
-    issues_timescale_list = []
-    timescale_options = ["30 days", "60 days", "90 days", "120 days", "180 days", "365 days", "Immediate"]
-    current_issue_title = None
-    current_timescale = 'Other'
-    table_data = []
-    
-    for page in ordered_doc.pages:
-        
-        try:
-            for table in page.tables:
-                for r, row in enumerate(table.rows):
-                    for c, cell in enumerate(row.cells):
-                        table_data.append("Table[{}][{}] = {}-{}".format(r,c, cell.text, cell.confidence))
-                    
-        except Exception as e:
-            print(f"Error processing page: {e}")
-            continue #Skip to next page if an error occurs 
-        
-        try:
-            for field in page.form.fields:
-                key = field.key.text if field.key else ""
-                if key:
-                    if field.key.text == "Issue Title":
-                        if current_issue_title and current_timescale:
-                            issues_timescale_list.append([current_issue_title, current_timescale])
-                        current_issue_title = field.value.text
-                        current_timescale = 'Other'
-                    elif field.key.text in timescale_options and field.value.text == "SELECTED":
-                        current_timescale = field.key.text
-                    
-        except Exception as e:
-            print(f"Error processing page: {e}")
-            continue #Skip to next page if an error occurs 
-
-    if current_issue_title and current_timescale:
-        issues_timescale_list.append([current_issue_title, current_timescale])
-        
-    return table_data, issues_timescale_list
+TIMESCALE_OPTIONS = ["30 days", "60 days", "90 days", "120 days", "180 days", "365 days", "Immediate"]
 
-def parse_issues(input_string):
-    # Split the input string into lines
-    lines = input_string.split('\n')
+# slack on bounding box comparisons, in fractions of the page
+BOX_TOLERANCE = 0.005
 
-    # Extract the part between <response> tags
-    response_start = None
-    response_end = None
-    for i, line in enumerate(lines):
-        if line.strip() == '<response>':
-            response_start = i + 1
-        elif line.strip() == '</response>':
-            response_end = i
-            break
+def row_text(row):
+    cells = [cell.text.strip() for cell in row.cells if cell.text and cell.text.strip()]
+    return " | ".join(cells)
 
-    if response_start is None or response_end is None:
-        return []
+def bounding_box(block):
+    return block.geometry.boundingBox
 
-    # Remove leading and trailing double quotes from each line
-    response_lines = []
-    for line in lines[response_start:response_end]:
-        cleaned_line = re.sub(r'^"(.+)"$', r'\1', line)
-        response_lines.append(cleaned_line)
-
-    response_content = '\n'.join(response_lines)
-
-    # Split the content into individual issue entries
-    issue_entries = re.findall(r'\[.*?\](?=,\n|\n])', response_content, re.DOTALL)
+def contains(outer, inner):
+    return (
+        outer.left - BOX_TOLERANCE <= inner.left
+        and outer.top - BOX_TOLERANCE <= inner.top
+        and inner.left + inner.width <= outer.left + outer.width + BOX_TOLERANCE
+        and inner.top + inner.height <= outer.top + outer.height + BOX_TOLERANCE
+    )
 
-    issues = []
-    for entry in issue_entries:
-        # Remove the outer brackets
-        entry = entry.strip()[1:-1]
+def title_above(titles, top):
+    """The record of the last (box, record) title starting at or above top"""
+    above = [record for box, record in titles if box.top <= top + BOX_TOLERANCE]
+    return above[-1] if above else None
 
-        # Split the entry into its components
-        components = re.split(r',\s*(?=[\'"])', entry)
+def owning_issue(titles, inside, top, table_top, carried):
+    """
+    Issue a row or checkbox at top belongs to. Inside a table holding issue titles
+    that is the last of those titles above it (or the table's first title); otherwise
+    the last title above the table on the page, or the issue carried over from earlier pages.
+    """
+    if inside:
+        return title_above(inside, top) or inside[0][1]
+    return title_above(titles, table_top) or carried
 
-        # Clean up each component by removing leading/trailing whitespace
-        cleaned_components = [comp.strip().strip('\'"') for comp in components]
+def iter_issue_records(ordered_doc):
+    """
+    Walk the geometrically ordered pages once and yield one record per "Issue Title"
+    with its selected timescale and the table rows that belong to it. A table holding
+    issue titles gives its rows to those titles; any other table goes to the last title
+    above it. Rows before the first issue title are kept for the first issue.
+    """
+    records = []
+    leading_rows = []
+    emitted = 0
+    
+    for page in ordered_doc.pages:
+        try:
+            carried = records[-1] if records else None
+            titles = []
+            for item in page.content:
+                if isinstance(item, trp.Field) and item.key and item.key.text == "Issue Title":
+                    record = {"title": item.value.text if item.value else "", "timescale": "Other", "context": []}
+                    titles.append((bounding_box(item), record))
+            tables = [
+                (item, bounding_box(item), [title for title in titles if contains(bounding_box(item), title[0])])
+                for item in page.content if isinstance(item, trp.Table)
+            ]
+            
+            for table, table_box, inside in tables:
+                for row in table.rows:
+                    text = row_text(row)
+                    if not text:
+                        continue
+                    row_top = min(bounding_box(cell).top for cell in row.cells)
+                    owner = owning_issue(titles, inside, row_top, table_box.top, carried)
+                    (owner["context"] if owner else leading_rows).append(text)
+            
+            for item in page.content:
+                if isinstance(item, trp.Field) and item.key and item.key.text in TIMESCALE_OPTIONS:
+                    if item.value and item.value.text == "SELECTED":
+                        box = bounding_box(item)
+                        table_box, inside = next(
+                            ((table_box, inside) for table, table_box, inside in tables if inside and contains(table_box, box)),
+                            (box, [])
+                        )
+                        owner = owning_issue(titles, inside, box.top, table_box.top, carried)
+                        if owner:
+                            owner["timescale"] = item.key.text
+            
+            records.extend(record for box, record in titles)
+        
+        except Exception as e:
+            print(f"Error processing page: {e}")
+            continue #Skip to next page if an error occurs 
 
-        # Remove any remaining brackets from the first and last components
-        cleaned_components[0] = cleaned_components[0].lstrip('[').lstrip('"')
-        cleaned_components[-1] = cleaned_components[-1].rstrip(']')
+        if records and leading_rows:
+            records[0]["context"][:0] = leading_rows
+            leading_rows = []
+        # everything but the last issue is complete, it may continue on the next page
+        for record in records[emitted:-1]:
+            if record["title"]:
+                yield record
+        emitted = max(len(records) - 1, emitted)
+
+    for record in records[emitted:]:
+        if record["title"]:
+            yield record
+
+def format_issue_records(issue_records):
+    return "\n\n".join(
+        f"Issue Title: {record['title']}\nTimescale: {record['timescale']}\nTable text:\n" + "\n".join(record["context"])
+        for record in issue_records
+    )
 
-        issues.append(cleaned_components)
+def estimate_tokens(text):
+    # roughly four characters per token for English text
+    return len(text) // 4 + 1
 
-    return issues
+def batch_issue_records(issue_records, max_tokens, max_issues):
+    """
+    Split the records into consecutive batches whose formatted text stays under
+    max_tokens (a single oversized issue gets a batch of its own) and max_issues
+    """
+    batches = []
+    batch = []
+    batch_tokens = 0
+    for record in issue_records:
+        tokens = estimate_tokens(format_issue_records([record]))
+        if batch and (batch_tokens + tokens > max_tokens or len(batch) >= max_issues):
+            batches.append(batch)
+            batch = []
+            batch_tokens = 0
+        batch.append(record)
+        batch_tokens += tokens
+    if batch:
+        batches.append(batch)
+    return batches
+
+def get_explanation(issue_records):
+    if explanation_batch_tokens <= 0:
+        return explain_issues(issue_records)
+    
+    batches = batch_issue_records(issue_records, explanation_batch_tokens, explanation_batch_issues)
+    print(f"Getting explanations for {len(issue_records)} issues in {len(batches)} batches")
+    with ThreadPoolExecutor(max_workers=explanation_max_workers) as executor:
+        results = list(executor.map(explain_issues, batches))
+    return [issue for result in results for issue in result]
 
-def get_explanation(table_data,issues_timescale_list):
+def explain_issues(issue_records):
     
-    table_input = ('\n\n').join(table_data)
+    issues_input = format_issue_records(issue_records)
     
     system_prompt = """
     You are a validation step in a data-science process,your responses should be consistent and reliable.
@@ -184,11 +259,8 @@ def get_explanation(table_data,issues_timescale_list):
     """
 
     user_prompt = f"""
-    Here is the list of issue_titles:
-    f{issues_timescale_list}
-
-    Here is the table data:
-    {table_input}
+    Here are the issue titles and timescales, each followed by the table text found after it in the report:
+    {issues_input}
 
     Please get the issue title and explanation for each issue.
     """
@@ -211,13 +283,21 @@ def get_explanation(table_data,issues_timescale_list):
     "top_p": 0.1
     })
 
-    response = bedrock_runtime.invoke_model(
+    response = llm_cache.invoke_model(
+        bedrock_runtime,
         body=body,
         modelId="us.anthropic.claude-3-7-sonnet-20250219-v1:0",
         accept="application/json",
         contentType="application/json",
     )
-    text = json.loads(response['body'].read())['content'][0]['text']
+    if response.get('stop_reason') == 'max_tokens':
+        # the parser would drop the unfinished entries, re-run the batch as two smaller ones
+        if len(issue_records) > 1:
+            middle = len(issue_records) // 2
+            print(f"Explanations for {len(issue_records)} issues were cut off, retrying as batches of {middle} and {len(issue_records) - middle}")
+            return explain_issues(issue_records[:middle]) + explain_issues(issue_records[middle:])
+        print(f"Explanation for {issue_records[0]['title']} was cut off at the token limit")
+    text = response['content'][0]['text']
     issue_timescale_explanation_list = parse_issues(text)
     
     return issue_timescale_explanation_list
@@ -231,7 +311,10 @@ def add_issue_to_dynamodb(issues_list,company_name,audit_date, clause,section):
     count_exact = 0
     count_bedrock = 0 
     
-    for item in issues_list: 
+    ratings = get_ratings(issues_list)
+    writer = BatchItemWriter(ddb_client, supplier_table)
+    
+    for position, item in enumerate(issues_list): 
         count+=1
         
         if len(item) !=4:
@@ -239,11 +322,7 @@ def add_issue_to_dynamodb(issues_list,company_name,audit_date, clause,section):
             continue 
 
         nc_observation = item[0]
-        issue_title = item[1]
-        if '-' in issue_title:
-            parts = issue_title.split('-', 1)
-            if parts[0].strip().isdigit():
-                issue_title = parts[1]
+        issue_title = clean_issue_title(item[1])
         timescale = item [2]
         explanation = item [3]
         audit_date_issue_no = audit_date+f'-{section}'+'#'+str(count)
@@ -251,7 +330,7 @@ def add_issue_to_dynamodb(issues_list,company_name,audit_date, clause,section):
         if 'non-compliance' in nc_observation.lower():
             count_issue+=1
              # updated_grading = best_match.get('Updated Grading'.{}).get('S')
-            best_match = get_rating(issue_title)
+            best_match = ratings[position]
             if best_match:
                 count_exact+=1
                 rating = best_match.get('Updated Grading',{}).get('S')
@@ -281,12 +360,8 @@ def add_issue_to_dynamodb(issues_list,company_name,audit_date, clause,section):
                             'Timescales Match': {'S': timescales_match}
                         }
                         
-                        resp = ddb_client.put_item(
-                            TableName= supplier_table,
-                            Item=ddb_entry)
-                            
-                        
-                        print(f"{ddb_entry} successfully written to {supplier_table}")        
+                        writer.put(ddb_entry)
+                        print(f"{ddb_entry} queued for {supplier_table}")        
                     else:
     
                         ddb_entry = {
@@ -303,11 +378,8 @@ def add_issue_to_dynamodb(issues_list,company_name,audit_date, clause,section):
                             'Exact Issue Title':{'S':'Yes'},
                             'Timescales Match': {'S': 'N/A'}
                         }
-                        resp = ddb_client.put_item(
-                            TableName= supplier_table,
-                            Item=ddb_entry
-                            )
-                        print(f"{ddb_entry} successfully written to {supplier_table} with no ESG timescale")
+                        writer.put(ddb_entry)
+                        print(f"{ddb_entry} queued for {supplier_table} with no ESG timescale")
                         
                 else:
                     validation_entry = (audit_date_issue_no, nc_observation, issue_title, explanation, timescale)
@@ -338,11 +410,8 @@ def add_issue_to_dynamodb(issues_list,company_name,audit_date, clause,section):
                 'Exact Issue Title':{'S':'No'},
                 'Timescales Match': {'S': 'N/A'}
             }
-            resp = ddb_client.put_item(
-                TableName= supplier_table,
-                Item=ddb_entry
-                )
-            print(f"Observation successfully written to {supplier_table}")
+            writer.put(ddb_entry)
+            print(f"Observation queued for {supplier_table}")
         
         elif 'good-example' in nc_observation.lower():
             count_observation+=1
@@ -363,16 +432,15 @@ def add_issue_to_dynamodb(issues_list,company_name,audit_date, clause,section):
                 'Exact Issue Title':{'S':'No'},
                 'Timescales Match': {'S': 'N/A'}
             }
-            resp = ddb_client.put_item(
-                TableName= supplier_table,
-                Item=ddb_entry
-                )
-            print(f"Good Example successfully written to {supplier_table}")
+            writer.put(ddb_entry)
+            print(f"Good Example queued for {supplier_table}")
         
+    failed_writes = writer.flush()
     count_bedrock = len(bedrock_validation_list)   
-    return bedrock_validation_list, count_issue, count_observation, count_exact, count_bedrock
+    return bedrock_validation_list, count_issue, count_observation, count_exact, count_bedrock, len(failed_writes)
                     
 
+@progress.reports_failures
 def handler(event,context):    
     # bucket = os.environ['REPORT_BUCKET']
     nc_uri= event["nc_uri"]
@@ -380,14 +448,15 @@ def handler(event,context):
     section = event["section"]
     company_name = event["company_name"]
     audit_date = event["audit_date"]
+    run = progress.start(import_uid_from_uri(nc_uri), "nc", section=section)
     
     ordered_doc = order_document(nc_uri)
-    table_data, issues_timescale = get_issues_timescale(ordered_doc)
+    issue_records = list(iter_issue_records(ordered_doc))
     
-    if len(issues_timescale) > 0: 
-        all_issues = get_explanation(table_data, issues_timescale)
+    if len(issue_records) > 0: 
+        all_issues = get_explanation(issue_records)
         print(all_issues)
-        bedrock_validation_list, count_issue, count_observation, count_exact, count_bedrock = add_issue_to_dynamodb(all_issues,company_name,audit_date,clause,section)
+        bedrock_validation_list, count_issue, count_observation, count_exact, count_bedrock, count_failed_writes = add_issue_to_dynamodb(all_issues,company_name,audit_date,clause,section)
         
     else:
         all_issues = None
@@ -396,7 +465,16 @@ def handler(event,context):
         count_observation = 0
         count_exact = 0
         count_bedrock = 0
+        count_failed_writes = 0
     
+    progress.finish(run, counts={
+        "issues": len(issue_records),
+        "non_compliances": count_issue,
+        "observations": count_observation,
+        "exact_matches": count_exact,
+        "unrated": count_bedrock,
+        "failed_writes": count_failed_writes,
+    })
 
     return {
         "nc_uri": nc_uri,
@@ -409,6 +487,7 @@ def handler(event,context):
         "count_issue": count_issue,
         "count_observation": count_observation,
         "count_exact": count_exact,
-        "count_bedrock": count_bedrock
+        "count_bedrock": count_bedrock,
+        "count_failed_writes": count_failed_writes
     }
     
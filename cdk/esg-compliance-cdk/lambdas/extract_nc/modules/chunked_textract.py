@@ -0,0 +1,74 @@
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import posixpath
+from typing import Dict, List
+
+import pymupdf
+from textractcaller.t_call import call_textract
+
+from modules.textract_cache import split_s3_uri
+
+logger = logging.getLogger(__file__)
+logger.setLevel(logging.INFO)
+
+
+def split_pdf(document: bytes, chunk_size: int) -> List[bytes]:
+    """Split a PDF into consecutive chunks of at most chunk_size pages"""
+    chunks = []
+    with pymupdf.open(stream=document, filetype="pdf") as doc:
+        for start in range(0, doc.page_count, chunk_size):
+            with pymupdf.open() as chunk:
+                chunk.insert_pdf(doc, from_page=start, to_page=min(start + chunk_size, doc.page_count) - 1)
+                chunks.append(chunk.tobytes(no_new_id=True))
+    return chunks
+
+
+def merge_responses(responses: List[Dict], chunk_size: int) -> Dict:
+    """
+    Join the Textract responses for consecutive page chunks into one response,
+    shifting each chunk's page numbers by the pages that came before it
+    """
+    blocks = []
+    for i, response in enumerate(responses):
+        offset = i * chunk_size
+        for block in response["Blocks"]:
+            blocks.append({**block, "Page": block.get("Page", 1) + offset})
+
+    merged = {key: value for key, value in responses[0].items() if key not in ("Blocks", "NextToken")}
+    merged["DocumentMetadata"] = {"Pages": sum(response["DocumentMetadata"]["Pages"] for response in responses)}
+    merged["Blocks"] = blocks
+    return merged
+
+
+def analyse_in_chunks(document_uri: str, features: list, chunk_size: int, s3_client, textract_client, max_workers: int = 4) -> Dict:
+    """
+    Run Textract over a section in chunks of chunk_size pages concurrently and merge
+    the results. Single pages are sent as bytes to the synchronous API; larger chunks
+    are staged next to the section in S3 for the asynchronous API.
+    """
+    bucket, key = split_s3_uri(document_uri)
+    document = s3_client.get_object(Bucket=bucket, Key=key)["Body"].read()
+    chunks = split_pdf(document, chunk_size)
+    if len(chunks) == 1:
+        return call_textract(input_document=document_uri, features=features, boto3_textract_client=textract_client)
+
+    stem, _ = posixpath.splitext(key)
+    chunk_keys = []
+    if chunk_size > 1:
+        chunk_keys = [f"{stem}_chunks/{i}.pdf" for i in range(len(chunks))]
+        for chunk_key, chunk in zip(chunk_keys, chunks):
+            s3_client.put_object(Bucket=bucket, Key=chunk_key, Body=chunk)
+    inputs = [f"s3://{bucket}/{chunk_key}" for chunk_key in chunk_keys] or chunks
+
+    logger.info(f"Analysing {document_uri} as {len(chunks)} chunks of up to {chunk_size} pages")
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            responses = list(executor.map(
+                lambda chunk: call_textract(input_document=chunk, features=features, boto3_textract_client=textract_client),
+                inputs
+            ))
+    finally:
+        if chunk_keys:
+            s3_client.delete_objects(Bucket=bucket, Delete={"Objects": [{"Key": chunk_key} for chunk_key in chunk_keys]})
+
+    return merge_responses(responses, chunk_size)
@@ -0,0 +1,92 @@
+import json
+import logging
+from typing import Dict, List, Optional
+
+from boto3.dynamodb.types import TypeSerializer
+from botocore.exceptions import ClientError
+from rapidfuzz import fuzz, process
+
+logger = logging.getLogger(__file__)
+logger.setLevel(logging.INFO)
+
+# JSON Lines snapshot of the whole table, rewritten by upload_grading on every ingest
+CATALOGUE_SNAPSHOT_KEY = "catalogue/gradings.jsonl"
+MATCH_THRESHOLD = 80
+
+
+class GradingCatalogue:
+    """
+    In-memory copy of the compliance gradings table, kept for the life of a
+    warm container and reloaded only when the catalogue snapshot in S3 changes.
+    Items are held in the low-level DynamoDB format whichever source they came from.
+    """
+    def __init__(self, ddb_client, s3_client, table_name: str, bucket: Optional[str] = None):
+        self.ddb_client = ddb_client
+        self.s3_client = s3_client
+        self.table_name = table_name
+        self.bucket = bucket
+        self.version = None
+        self.items = None
+        self.titles = []
+        self.serializer = TypeSerializer()
+
+    def get_version(self) -> Optional[str]:
+        if not self.bucket:
+            return None
+        try:
+            response = self.s3_client.head_object(Bucket=self.bucket, Key=CATALOGUE_SNAPSHOT_KEY)
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("404", "NoSuchKey"):
+                return None
+            raise e
+        return response["ETag"]
+
+    def load_snapshot(self) -> List[Dict]:
+        response = self.s3_client.get_object(Bucket=self.bucket, Key=CATALOGUE_SNAPSHOT_KEY)
+        items = []
+        for line in response["Body"].iter_lines():
+            if line:
+                item = json.loads(line)
+                items.append({key: self.serializer.serialize(value) for key, value in item.items()})
+        return items
+
+    def load(self) -> List[Dict]:
+        items = []
+        paginator = self.ddb_client.get_paginator("scan")
+        for page in paginator.paginate(TableName=self.table_name):
+            items.extend(page.get("Items", []))
+        return items
+
+    def refresh(self) -> None:
+        version = self.get_version()
+        if self.items is not None and version == self.version:
+            return
+
+        # fall back to scanning the table until a snapshot has been written
+        self.items = self.load_snapshot() if version else self.load()
+        self.titles = [item.get("Issue Title", {}).get("S", "").lower() for item in self.items]
+        self.version = version
+        logger.info(f"Loaded {len(self.items)} gradings for {self.table_name} (version {version})")
+
+    def best_matches(self, issue_titles: List[str]) -> List[Optional[Dict]]:
+        """
+        Score every issue title against every catalogue title in one call and
+        return the best catalogue item per issue, or None when nothing scores
+        above MATCH_THRESHOLD. Only catalogue titles that contain the issue title
+        are candidates: partial_ratio alone would let a short catalogue title
+        score 100 against any long issue that happens to include it.
+        """
+        self.refresh()
+        if not issue_titles or not self.titles:
+            return [None for _ in issue_titles]
+
+        queries = [title.strip().lower() for title in issue_titles]
+        scores = process.cdist(queries, self.titles, scorer=fuzz.partial_ratio, workers=-1)
+
+        matches = []
+        for query, row in zip(queries, scores):
+            row = row * [query in title for title in self.titles]
+            best = int(row.argmax())
+            logger.info(f"Best grading match for '{query}' scored {row[best]}")
+            matches.append(self.items[best] if row[best] > MATCH_THRESHOLD else None)
+        return matches
@@ -0,0 +1,142 @@
+import json
+import logging
+import re
+from typing import Iterator, List, Tuple
+
+logger = logging.getLogger(__file__)
+logger.setLevel(logging.INFO)
+
+# the prompt asks for <response> but the model sometimes answers in <format>, and may be cut off
+RESPONSE_PATTERN = re.compile(r"<(response|format)>(.*?)(?:</\1>|$)", re.DOTALL)
+NON_SPACE_PATTERN = re.compile(r"\S")
+ESCAPES = {"n": "\n", "t": "\t", "r": "\r"}
+ISSUE_FIELDS = 4
+
+
+def response_body(text: str) -> str:
+    match = RESPONSE_PATTERN.search(text)
+    return match.group(2) if match else text
+
+
+def clean_component(value) -> str:
+    return str(value).strip()
+
+
+def json_entries(value) -> Iterator[list]:
+    """Yield every innermost list of a decoded JSON value"""
+    if not isinstance(value, list):
+        return
+    if not any(isinstance(item, list) for item in value):
+        yield value
+        return
+    for item in value:
+        yield from json_entries(item)
+
+
+def next_char(text: str, start: int) -> str:
+    match = NON_SPACE_PATTERN.search(text, start)
+    return match.group() if match else ""
+
+
+def closes_string(text: str, end: int) -> bool:
+    following = next_char(text, end)
+    if following in ("", "]"):
+        return True
+    if following == ",":
+        return next_char(text, text.index(",", end) + 1) in ("", "]", "[", "'", '"')
+    return False
+
+
+def read_string(text: str, start: int) -> Tuple[str, int]:
+    """
+    Read the quoted string opening at start. A quote only closes the string when it is
+    followed by a closing bracket, the end of the text, or a comma and the next value,
+    so unescaped quotes and apostrophes inside explanations are kept. Returns the index
+    after the string, or -1 when the text ends first.
+    """
+    quote = text[start]
+    chars = []
+    i = start + 1
+    while i < len(text):
+        char = text[i]
+        if char == "\\" and i + 1 < len(text):
+            chars.append(ESCAPES.get(text[i + 1], text[i + 1]))
+            i += 2
+            continue
+        if char == quote and closes_string(text, i + 1):
+            return "".join(chars), i + 1
+        chars.append(char)
+        i += 1
+    return "".join(chars), -1
+
+
+def opens_wrapped_entry(text: str, quote: int) -> bool:
+    return text[quote + 1:quote + 2] == "[" and next_char(text, quote + 2) in ("'", '"')
+
+
+def scan_entries(text: str) -> Iterator[list]:
+    """
+    Incremental fallback for responses json.loads rejects: yields every innermost
+    bracketed list as a list of strings, accepting single quotes, unquoted values,
+    unescaped quotes, trailing commas, entries wrapped in quotes and a missing outer
+    array. An entry left open by a truncated response is dropped.
+    """
+    stack = []
+    previous = ""
+    i = 0
+    while i < len(text):
+        char = text[i]
+        if char in "'\"" and (opens_wrapped_entry(text, i) or previous == "]"):
+            # quotes wrapped around a whole entry
+            i += 1
+            continue
+        if char == "[":
+            stack.append([])
+            i += 1
+        elif char == "]":
+            if stack:
+                items = stack.pop()
+                # a list holding lists has already yielded its entries
+                if None not in items:
+                    yield items
+                if stack:
+                    stack[-1].append(None)
+            i += 1
+        elif not stack or char.isspace() or char == ",":
+            i += 1
+        elif char in "'\"":
+            value, end = read_string(text, i)
+            if end == -1:
+                return
+            stack[-1].append(value)
+            i = end
+        else:
+            end = i
+            while end < len(text) and text[end] not in ",]":
+                end += 1
+            stack[-1].append(text[i:end])
+            i = end
+        if not char.isspace():
+            previous = text[i - 1]
+
+
+def iter_issues(text: str) -> Iterator[Tuple[str, str, str, str]]:
+    """
+    Yield (issue type, issue title, timescale, explanation) for each entry of the model's
+    response, decoding it with json.loads and falling back to scan_entries when that fails
+    """
+    body = response_body(text).strip()
+    try:
+        entries = json_entries(json.loads(body))
+    except ValueError:
+        entries = scan_entries(body)
+
+    for entry in entries:
+        if len(entry) != ISSUE_FIELDS:
+            logger.info(f"Skipping malformed issue entry: {entry}")
+            continue
+        yield tuple(clean_component(component) for component in entry)
+
+
+def parse_issues(text: str) -> List[Tuple[str, str, str, str]]:
+    return list(iter_issues(text))
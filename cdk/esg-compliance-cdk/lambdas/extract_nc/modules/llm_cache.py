@@ -0,0 +1,113 @@
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+import gzip
+import hashlib
+import json
+import logging
+import threading
+from typing import Dict, Optional
+
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger(__file__)
+logger.setLevel(logging.INFO)
+
+CACHE_PREFIX = "llm-cache"
+
+
+class S3ResponseStore:
+    """
+    Persistent tier of the LLM response cache: one gzipped JSON object per response,
+    treated as missing once it is older than ttl_days
+    """
+    def __init__(self, s3_client, bucket: str, prefix: str = CACHE_PREFIX, ttl_days: float = 30):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.prefix = prefix
+        self.ttl = timedelta(days=ttl_days)
+
+    def get(self, key: str) -> Optional[Dict]:
+        try:
+            response = self.s3_client.get_object(Bucket=self.bucket, Key=f"{self.prefix}/{key}.json.gz")
+        except ClientError as e:
+            if e.response["Error"]["Code"] not in ("404", "NoSuchKey"):
+                logger.warning(f"Could not read LLM cache entry {key}: {e}")
+            return None
+        if datetime.now(timezone.utc) - response["LastModified"] > self.ttl:
+            return None
+        return json.loads(gzip.decompress(response["Body"].read()))
+
+    def put(self, key: str, value: Dict) -> None:
+        try:
+            self.s3_client.put_object(
+                Bucket=self.bucket,
+                Key=f"{self.prefix}/{key}.json.gz",
+                Body=gzip.compress(json.dumps(value).encode("utf-8")),
+                ContentType="application/json",
+                ContentEncoding="gzip",
+            )
+        except ClientError as e:
+            logger.warning(f"Could not write LLM cache entry {key}: {e}")
+
+
+class LLMResponseCache:
+    """
+    Caches Bedrock invoke_model responses keyed by the model id and the request body
+    (system prompt, messages and inference parameters). Lookups go to an in-process
+    LRU first and then to the optional persistent store, which can be any object
+    with get(key) and put(key, value).
+    """
+    def __init__(self, store=None, maxsize: int = 128):
+        self.store = store
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def cache_key(self, model_id: str, body: str) -> str:
+        request = json.dumps({"modelId": model_id, "body": json.loads(body)}, sort_keys=True)
+        return hashlib.sha256(request.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict]:
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return self.entries[key]
+        value = self.store.get(key) if self.store else None
+        if value is not None:
+            self.remember(key, value)
+        return value
+
+    def remember(self, key: str, value: Dict) -> None:
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def put(self, key: str, value: Dict) -> None:
+        self.remember(key, value)
+        if self.store:
+            self.store.put(key, value)
+
+    def invoke_model(self, bedrock_runtime, body: str, modelId: str, **kwargs) -> Dict:
+        """
+        Drop-in for bedrock_runtime.invoke_model that returns the decoded response body.
+        Truncated responses are returned but not cached.
+        """
+        key = self.cache_key(modelId, body)
+        cached = self.get(key)
+        if cached is not None:
+            logger.info(f"LLM cache hit for {modelId} ({key})")
+            return cached
+
+        response = bedrock_runtime.invoke_model(body=body, modelId=modelId, **kwargs)
+        value = json.loads(response["body"].read())
+        if value.get("stop_reason") != "max_tokens":
+            self.put(key, value)
+        return value
+
+
+def s3_llm_cache(s3_client, bucket: Optional[str], ttl_days: float = 30, maxsize: int = 128) -> LLMResponseCache:
+    """Build a cache backed by S3, or an in-process only cache when no bucket is configured"""
+    store = S3ResponseStore(s3_client, bucket, ttl_days=ttl_days) if bucket else None
+    return LLMResponseCache(store=store, maxsize=maxsize)
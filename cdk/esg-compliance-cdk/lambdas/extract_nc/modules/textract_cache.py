@@ -0,0 +1,78 @@
+import gzip
+import hashlib
+import json
+import logging
+from typing import Callable, Dict, Iterable, Optional, Tuple
+from urllib.parse import urlparse
+
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger(__file__)
+logger.setLevel(logging.INFO)
+
+CACHE_PREFIX = "textract-cache"
+
+
+def split_s3_uri(uri: str) -> Tuple[str, str]:
+    parsed = urlparse(uri)
+    return parsed.netloc, parsed.path.lstrip("/")
+
+
+class TextractCache:
+    """
+    Content-addressed store of raw Textract responses, saved as gzipped JSON in S3.
+    Entries are keyed by the SHA-256 of the document bytes and the requested feature set,
+    so a re-uploaded report or a retried task reuses the earlier analysis.
+    Entries are written to the document's own bucket unless a bucket is given.
+    """
+    def __init__(self, s3_client, bucket: Optional[str] = None, prefix: str = CACHE_PREFIX):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.prefix = prefix
+
+    def cache_key(self, document: bytes, features: Iterable) -> str:
+        feature_names = "-".join(sorted(getattr(feature, "name", str(feature)).lower() for feature in features))
+        digest = hashlib.sha256(document).hexdigest()
+        return f"{self.prefix}/{digest}-{feature_names}.json.gz"
+
+    def get(self, bucket: str, key: str) -> Optional[Dict]:
+        try:
+            response = self.s3_client.get_object(Bucket=bucket, Key=key)
+        except ClientError as e:
+            if e.response["Error"]["Code"] not in ("404", "NoSuchKey"):
+                logger.warning(f"Could not read Textract cache entry {key}: {e}")
+            return None
+        return json.loads(gzip.decompress(response["Body"].read()))
+
+    def put(self, bucket: str, key: str, textract_response: Dict) -> None:
+        body = gzip.compress(json.dumps(textract_response).encode("utf-8"))
+        try:
+            self.s3_client.put_object(
+                Bucket=bucket,
+                Key=key,
+                Body=body,
+                ContentType="application/json",
+                ContentEncoding="gzip",
+            )
+        except ClientError as e:
+            logger.warning(f"Could not write Textract cache entry {key}: {e}")
+
+    def analyse(self, document_uri: str, features: Iterable, analyse: Callable[[], Dict]) -> Dict:
+        """
+        Return the cached Textract response for the document at document_uri,
+        calling analyse and caching its response on a miss
+        """
+        document_bucket, document_key = split_s3_uri(document_uri)
+        document = self.s3_client.get_object(Bucket=document_bucket, Key=document_key)["Body"].read()
+
+        bucket = self.bucket or document_bucket
+        key = self.cache_key(document, features)
+        cached = self.get(bucket, key)
+        if cached is not None:
+            logger.info(f"Textract cache hit for {document_uri}: s3://{bucket}/{key}")
+            return cached
+
+        logger.info(f"Textract cache miss for {document_uri}, running analysis")
+        textract_response = analyse()
+        self.put(bucket, key, textract_response)
+        return textract_response
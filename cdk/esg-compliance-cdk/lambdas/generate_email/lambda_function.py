@@ -4,6 +4,8 @@ import re
 import os 
 import boto3
 
+from modules.progress import ProgressRecorder
+
 supplier_table = os.environ['SUPPLIER_TABLE']
 
 logger = logging.getLogger(__file__)
@@ -11,6 +13,7 @@ logger.setLevel(logging.INFO)
 
 ddb = boto3.resource('dynamodb')
 bedrock_runtime = boto3.client('bedrock-runtime')
+progress = ProgressRecorder(boto3.client('dynamodb'), os.environ.get('STATUS_TABLE'))
 
 prompt= """You are a Social Sustainability Assistant working for AnyCompany Fashion.
 Your task is to construct an email which will be sent to a supplier following evaluation of their audit
@@ -233,6 +236,7 @@ def get_issues_markdown(table_name: str, company_name: str, audit_date: str) ->
     return issues_to_markdown(issues)
 
     
+@progress.reports_failures
 def handler(event, context):
     
     nc_uri = event["nc_uri"]
@@ -244,6 +248,7 @@ def handler(event, context):
     clause = event["clause"]
     
     s3_client = boto3.client('s3')
+    run = progress.start(import_uid, "email")
     
     logger.info(f"Getting email for {company_name} on {audit_date}")
     response = get_audit_issues(supplier_table, company_name, audit_date)
@@ -268,6 +273,7 @@ def handler(event, context):
         Key=remote_email_key,
         Body=email_markdown.encode('utf-8')
     )
+    progress.finish(run, counts={"issues": len(issues)})
     
     return {
       "statusCode": 200,
@@ -1,62 +1,80 @@
 import boto3 
-from boto3.dynamodb.conditions import Key, Attr
+from boto3.dynamodb.conditions import Key
 import os
 
+from modules.nc_records import CONTENT_TYPE, FLAG_COLUMNS, TEXT_COLUMNS, dumps_records, issue_number
+from modules.progress import ProgressRecorder
+
 # Create a DynamoDB client
 ddb = boto3.resource('dynamodb')
 s3_client = boto3.client('s3')
 
 supplier_table = os.environ['SUPPLIER_TABLE']
+progress = ProgressRecorder(boto3.client('dynamodb'), os.environ.get('STATUS_TABLE'))
 
+# only what dumps_records writes out
+PROJECTED_ATTRIBUTES = ['AuditDateIssueNumber'] + TEXT_COLUMNS + FLAG_COLUMNS
 
 
-def get_issue_titles_for_clause(supplier_table,company_name, audit_date, clause):
-
-    # Query parameters
-    response = ddb.Table(supplier_table).query(
-        KeyConditionExpression=Key('Company Name').eq(company_name) & Key('AuditDateIssueNumber').begins_with(audit_date),
-        FilterExpression=Attr('Clause').eq(clause),
-    )
 
-    items = response['Items']
+def get_issues_for_section(supplier_table,company_name, audit_date, section):
+    """
+    Read one audit's issues for a section, projected to the result columns and
+    following every page. extract_nc and validate_unrated_issues key them as
+    {audit date}-{section}#{issue number} and finish writing just before this runs,
+    so the read is strongly consistent. Returns the items and the read capacity consumed.
+    """
+    attribute_names = {f"#a{i}": name for i, name in enumerate(PROJECTED_ATTRIBUTES)}
+    query = {
+        'KeyConditionExpression': Key('Company Name').eq(company_name) & Key('AuditDateIssueNumber').begins_with(f"{audit_date}-{section}#"),
+        'ProjectionExpression': ", ".join(attribute_names),
+        'ExpressionAttributeNames': attribute_names,
+        'ConsistentRead': True,
+        'ReturnConsumedCapacity': 'TOTAL',
+    }
+    table = ddb.Table(supplier_table)
 
-    # Handle pagination if there are more results
-    while 'LastEvaluatedKey' in response:
-        response = supplier_table.query(
-            KeyConditionExpression=Key('Company Name').eq(company_name) & Key('AuditDateIssueNumber').begins_with(audit_date),
-            FilterExpression=Attr('Clause').eq(clause),
-            ProjectionExpression='Issue Title, ESG Rating, Report Timescale, Issue Type',
-            ExclusiveStartKey=response['LastEvaluatedKey']
-        )
+    items = []
+    read_units = 0
+    while True:
+        response = table.query(**query)
         items.extend(response['Items'])
+        read_units += response.get('ConsumedCapacity', {}).get('CapacityUnits', 0)
+        if 'LastEvaluatedKey' not in response:
+            break
+        query['ExclusiveStartKey'] = response['LastEvaluatedKey']
 
-    return items
+    # the sort key orders issue numbers as strings
+    items.sort(key=lambda item: issue_number(item.get('AuditDateIssueNumber')) or 0)
+    print(f"Read {len(items)} issues for {section} using {read_units} read capacity units")
+    return items, read_units
 
 
+@progress.reports_failures
 def handler(event, context):
     
     nc_uri = event["nc_uri"]
     section = event["section"]
     company_name = event["company_name"]
     audit_date = event["audit_date"]
-    clause = event["clause"]
     
 
     bucket = nc_uri.split('/')[2]
     import_uid = nc_uri.split('/')[3]
+    run = progress.start(import_uid, "results", section=section)
     
-    data = get_issue_titles_for_clause(supplier_table,company_name, audit_date, clause)
+    data, read_units = get_issues_for_section(supplier_table,company_name, audit_date, section)
     
-    # Convert the data to a string
-    data_str = str(data)
-    file_key = f"{import_uid}/processing/{section}_nc_data.txt"
+    # One JSON object per issue with a fixed set of columns
+    file_key = f"{import_uid}/processing/{section}_nc_data.jsonl"
     
-    # Upload the string data to S3
     s3_client.put_object(
         Bucket=bucket,
         Key=file_key,
-        Body=data_str
+        Body=dumps_records(data).encode("utf-8"),
+        ContentType=CONTENT_TYPE
     )
+    progress.finish(run, counts={"issues": len(data), "read_units": read_units})
     
     return {
         'statusCode': 200,
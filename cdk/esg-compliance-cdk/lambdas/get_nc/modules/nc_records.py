@@ -0,0 +1,57 @@
+import json
+from typing import Dict, Iterable, Optional
+
+# fixed schema of the {section}_nc_data.jsonl files read by the upload page and bulk analytics
+NC_COLUMNS = [
+    "Company Name",
+    "Date Of Audit",
+    "Clause",
+    "Issue Number",
+    "Issue Type",
+    "Issue Title",
+    "ESG Rating",
+    "Report Timescale",
+    "ESG Timescale",
+    "Timescales Match",
+    "Exact Issue Title",
+]
+TEXT_COLUMNS = [
+    "Company Name",
+    "Date Of Audit",
+    "Clause",
+    "Issue Type",
+    "Issue Title",
+    "ESG Rating",
+    "Report Timescale",
+    "ESG Timescale",
+]
+FLAG_COLUMNS = ["Timescales Match", "Exact Issue Title"]
+FLAG_VALUES = {"yes": True, "no": False}
+CONTENT_TYPE = "application/x-ndjson"
+
+
+def issue_number(sort_key: Optional[str]) -> Optional[int]:
+    # AuditDateIssueNumber ends in #{count}
+    if not sort_key or "#" not in sort_key:
+        return None
+    number = sort_key.rsplit("#", 1)[1]
+    return int(number) if number.isdigit() else None
+
+
+def flag(value) -> Optional[bool]:
+    """Yes/No match flags as booleans, anything else (N/A, missing) as null"""
+    return FLAG_VALUES.get(str(value).strip().lower()) if value is not None else None
+
+
+def to_record(item: Dict) -> Dict:
+    """Map a supplier table item onto the NC_COLUMNS schema"""
+    record = {column: (str(item[column]) if item.get(column) is not None else None) for column in TEXT_COLUMNS}
+    record["Issue Number"] = issue_number(item.get("AuditDateIssueNumber"))
+    for column in FLAG_COLUMNS:
+        record[column] = flag(item.get(column))
+    return {column: record[column] for column in NC_COLUMNS}
+
+
+def dumps_records(items: Iterable[Dict]) -> str:
+    """Serialise supplier table items as JSON Lines, one issue per line"""
+    return "".join(json.dumps(to_record(item), ensure_ascii=False) + "\n" for item in items)
@@ -0,0 +1,131 @@
+from datetime import datetime, timezone
+import functools
+import logging
+from typing import Callable, Dict, List, Optional
+
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger(__file__)
+logger.setLevel(logging.INFO)
+
+# sort key of the item the status_events lambda keeps up to date from Step Functions
+EXECUTION_RECORD = "execution"
+
+
+def import_uid_from_uri(uri: str) -> str:
+    # s3://bucket/{import_uid}/processing/...
+    return uri.split('/')[3]
+
+
+class ProgressRecorder:
+    """
+    Writes one status table item per pipeline stage (and section) of an import, and bumps
+    the Version counter on the import's execution item so readers can poll that single
+    item and only query the stage items when it changes. Does nothing without a table name.
+    """
+    def __init__(self, ddb_client, table_name: Optional[str]):
+        self.ddb_client = ddb_client
+        self.table_name = table_name
+        # runs started but not yet finished by the current invocation
+        self.open_runs: List[Dict] = []
+
+    def reports_failures(self, handler: Callable) -> Callable:
+        """Decorate a lambda handler so stages it leaves running when it raises are recorded as failed"""
+        @functools.wraps(handler)
+        def wrapper(event, context):
+            # warm containers reuse the recorder, drop anything left by an earlier invocation
+            self.open_runs = []
+            try:
+                return handler(event, context)
+            except Exception as e:
+                for run in self.open_runs:
+                    self.fail(run, e)
+                raise
+            finally:
+                self.open_runs = []
+        return wrapper
+
+    def start(self, import_uid: str, stage: str, section: Optional[str] = None) -> Dict:
+        """Record the stage as running and return the handle finish expects"""
+        run = {"import_uid": import_uid, "stage": stage, "section": section, "started_at": datetime.now(timezone.utc)}
+        self.record(import_uid, stage, "running", section=section, started_at=run["started_at"])
+        self.open_runs.append(run)
+        return run
+
+    def finish(self, run: Dict, counts: Optional[Dict[str, int]] = None) -> None:
+        """Record the stage as completed with its end time, duration and counts"""
+        self.close(run)
+        self.record(
+            run["import_uid"],
+            run["stage"],
+            "completed",
+            section=run["section"],
+            started_at=run["started_at"],
+            ended_at=datetime.now(timezone.utc),
+            counts=counts,
+        )
+
+    def fail(self, run: Dict, error: Exception) -> None:
+        """Record the stage as failed with its end time, duration and the error"""
+        self.close(run)
+        self.record(
+            run["import_uid"],
+            run["stage"],
+            "failed",
+            section=run["section"],
+            started_at=run["started_at"],
+            ended_at=datetime.now(timezone.utc),
+            error=f"{type(error).__name__}: {error}",
+        )
+
+    def close(self, run: Dict) -> None:
+        if run in self.open_runs:
+            self.open_runs.remove(run)
+
+    def record(
+        self,
+        import_uid: str,
+        stage: str,
+        status: str,
+        section: Optional[str] = None,
+        started_at: Optional[datetime] = None,
+        ended_at: Optional[datetime] = None,
+        counts: Optional[Dict[str, int]] = None,
+        error: Optional[str] = None,
+    ) -> None:
+        if not self.table_name:
+            return
+
+        updated_at = datetime.now(timezone.utc).isoformat()
+        item = {
+            'Import Uid': {'S': import_uid},
+            'Record': {'S': f"stage#{stage}#{section}" if section else f"stage#{stage}"},
+            'Stage': {'S': stage},
+            'Status': {'S': status},
+            'Updated At': {'S': updated_at},
+        }
+        if section:
+            item['Section'] = {'S': section}
+        if started_at:
+            item['Started At'] = {'S': started_at.isoformat()}
+        if ended_at:
+            item['Ended At'] = {'S': ended_at.isoformat()}
+        if started_at and ended_at:
+            item['Duration Ms'] = {'N': str(int((ended_at - started_at).total_seconds() * 1000))}
+        if counts:
+            item['Counts'] = {'M': {name: {'N': str(count)} for name, count in counts.items()}}
+        if error:
+            item['Error'] = {'S': error[:1000]}
+
+        try:
+            self.ddb_client.put_item(TableName=self.table_name, Item=item)
+            self.ddb_client.update_item(
+                TableName=self.table_name,
+                Key={'Import Uid': {'S': import_uid}, 'Record': {'S': EXECUTION_RECORD}},
+                UpdateExpression="SET #updated = :updated ADD Version :one",
+                ExpressionAttributeNames={'#updated': 'Updated At'},
+                ExpressionAttributeValues={':updated': {'S': updated_at}, ':one': {'N': '1'}},
+            )
+        except ClientError as e:
+            # progress is informational, never fail the pipeline over it
+            logger.warning(f"Could not record {stage} progress for {import_uid}: {e}")
@@ -1,12 +1,19 @@
 import json
+import os
 
 import logging
 
+import boto3
+
+from modules.progress import ProgressRecorder
 from modules.report_split import split_report
 
 logger = logging.getLogger(__file__)
 logger.setLevel(logging.INFO)
 
+progress = ProgressRecorder(boto3.client('dynamodb'), os.getenv("STATUS_TABLE"))
+
+@progress.reports_failures
 def handler(event, context):
     logger.info(f"request: {json.dumps(event)}")
     
@@ -16,12 +23,14 @@ def handler(event, context):
     key = event["detail"]["detail"]["object"]["key"]
     import_uid = key.split('/')[0]
     
+    run = progress.start(import_uid, "split")
     logger.info("Splitting report")
     supplier_uri, nc_uri_list = split_report(
         bucket=bucket,
         key=key,
         import_uid=import_uid
     )
+    progress.finish(run, counts={"sections": len(nc_uri_list)})
 
     logger.info("Returning response")
     return {
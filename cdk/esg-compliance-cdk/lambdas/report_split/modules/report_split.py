@@ -1,35 +1,90 @@
+from concurrent.futures import ThreadPoolExecutor
+import io
+import json
 import logging
-from typing import List
+import tempfile
+from typing import Dict, Iterable, List, Optional, Tuple
 from uuid import uuid4
 
 import boto3
+from boto3.s3.transfer import TransferConfig
 import pymupdf
 import yaml
 import os 
 
+from modules.section_ranges import natural_sort_key, resolve_section_ranges
+from modules.term_matcher import TermMatcher
+
 logger = logging.getLogger(__file__)
 logger.setLevel(logging.INFO)
 
 s3_client = boto3.client('s3')
 
+# set to "true" to keep the per-page text alongside the split sections for debugging/reuse
+SAVE_PAGE_TEXT_INDEX = os.getenv("SAVE_PAGE_TEXT_INDEX", "false").lower() == "true"
+# bound on concurrent S3 uploads of the split section documents
+SPLIT_UPLOAD_WORKERS = int(os.getenv("SPLIT_UPLOAD_WORKERS", "8"))
+# reports above this size are spooled to /tmp instead of being held in memory
+REPORT_MEMORY_LIMIT_BYTES = int(os.getenv("REPORT_MEMORY_LIMIT_BYTES", str(256 * 1024 * 1024)))
+
+TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=8 * 1024 * 1024,
+    multipart_chunksize=8 * 1024 * 1024,
+)
+
+    
+def open_report(bucket: str, key: str) -> Tuple[pymupdf.Document, Optional[str]]:
+    """
+    Open the report straight from S3 in memory, spilling to a unique temp file
+    only when it is larger than REPORT_MEMORY_LIMIT_BYTES
+    """
+    response = s3_client.get_object(Bucket=bucket, Key=key)
+    size = response["ContentLength"]
     
-def download_report(bucket: str, key: str) -> str:
-    local_report_path = "/tmp/report.pdf"
-    s3_client.download_file(bucket, key, local_report_path)
+    if size <= REPORT_MEMORY_LIMIT_BYTES:
+        logger.info(f"Opening {size} byte report in memory")
+        return pymupdf.open(stream=response["Body"].read(), filetype="pdf"), None
     
-    return local_report_path
+    logger.info(f"Report is {size} bytes, spilling to ephemeral storage")
+    response["Body"].close()
+    fd, local_report_path = tempfile.mkstemp(suffix=".pdf")
+    with os.fdopen(fd, "wb") as f:
+        s3_client.download_fileobj(bucket, key, f, Config=TRANSFER_CONFIG)
+    return pymupdf.open(local_report_path), local_report_path
 
 
-def identify_pages_from_config(local_path_to_doc, config) -> dict:
-    for page in config.values():
-        page["identified_pages"] = []
-        
-    with pymupdf.open(local_path_to_doc) as doc:
-        for page in doc:
-            text = page.get_text("text").lower()
-            for obj in config.values():
-                if all(term.lower() in text for term in obj["search_terms"]):
-                    obj["identified_pages"].append(page.number)
+def build_page_text_index(doc: pymupdf.Document) -> List[str]:
+    """
+    Extract the lowercased text of every page once so each locator can reuse it
+    """
+    page_texts = [page.get_text("text").lower() for page in doc]
+    logger.info(f"Built page text index for {len(page_texts)} pages")
+    return page_texts
+
+
+def upload_page_text_index(page_texts: List[str], bucket: str, uid: str) -> str:
+    remote_index_key = f"{uid}/processing/page_text_index.json"
+    s3_client.put_object(
+        Bucket=bucket,
+        Key=remote_index_key,
+        Body=json.dumps(page_texts).encode("utf-8")
+    )
+    return f"s3://{bucket}/{remote_index_key}"
+
+
+def compile_search_terms(*configs: dict) -> TermMatcher:
+    return TermMatcher(
+        term.lower()
+        for config in configs
+        for obj in config.values()
+        for term in obj["search_terms"]
+    )
+
+
+def identify_pages_from_config(page_texts: List[str], postings: Dict[str, List[int]], config) -> dict:
+    for obj in config.values():
+        search_terms = [term.lower() for term in obj["search_terms"]]
+        obj["identified_pages"] = TermMatcher.match_all(postings, search_terms, len(page_texts))
         
     # in cases of info being spread across pages, look at page pairs
     missing_sections = {}
@@ -37,25 +92,34 @@ def identify_pages_from_config(local_path_to_doc, config) -> dict:
         if val["identified_pages"] == []:
             missing_sections[section] = val
 
-    with pymupdf.open(local_path_to_doc) as doc:
-        for i in range(len(doc)):
-            current_page = doc[i].get_text("text").lower()
-            if i < len(doc) - 1:
-                next_page = doc[i+1].get_text("text").lower()
-                text = current_page + next_page
-            else:
-                text = current_page
-                
-            for obj in missing_sections.values():
-                if all(term.lower() in text for term in obj["search_terms"]):
-                    obj["identified_pages"].append(doc[i].number)
+    if not missing_sections:
+        return config
+
+    for i in range(len(page_texts)):
+        if i < len(page_texts) - 1:
+            text = page_texts[i] + page_texts[i+1]
+        else:
+            text = page_texts[i]
+            
+        for obj in missing_sections.values():
+            if all(term.lower() in text for term in obj["search_terms"]):
+                obj["identified_pages"].append(i)
     return config
-    
-def get_supplier_pages(local_report_path):
+
+
+def load_supplier_config() -> dict:
     with open("config/supplier_pages.yaml") as f:
-        supplier_config = yaml.safe_load(f)
+        return yaml.safe_load(f)
+
+
+def load_section_config(bucket_name: str, import_uid: str) -> dict:
+    yaml_file = f"{import_uid}/config/compliance_config.yaml"
+    response = s3_client.get_object(Bucket=bucket_name, Key=yaml_file)
+    return yaml.safe_load(response["Body"].read())
+
     
-    processed_config = identify_pages_from_config(local_report_path, supplier_config)
+def get_supplier_pages(page_texts: List[str], postings: Dict[str, List[int]], supplier_config: dict):
+    processed_config = identify_pages_from_config(page_texts, postings, supplier_config)
     page_numbers = []
     for item in processed_config.values():
         page_numbers += item["identified_pages"]
@@ -65,100 +129,117 @@ def get_supplier_pages(local_report_path):
     return page_numbers
 
 
-def get_section_pages(bucket_name,local_report_path, import_uid):
-    yaml_file = f"{import_uid}/config/compliance_config.yaml"
-    local_yaml_path = "/tmp/compliance_config.yaml"
-    s3_client.download_file(bucket_name,yaml_file,local_yaml_path)
-    with open(local_yaml_path) as f:
-        section_config = yaml.safe_load(f)
-        
-    processed_config = identify_pages_from_config(local_report_path, section_config)
-    print(processed_config)
-    config_values = list(processed_config.values())
-    config_keys = list(processed_config.keys())
-    selected_clauses = [ ]
-    selected_sections =[]
-    for i in range(len(processed_config)):
-        print(i)
-        print(config_values[i].keys())
-        if i == len(processed_config)-1:
-            break
-        if 'selected' in config_values[i].keys():
-            clause = config_values[i]['clause']
-            selected_section = config_keys[i]
-            selected_sections.append(selected_section)
-            selected_clauses.append(clause)
-            
-            current_section = processed_config[config_keys[i]]
-            next_section = processed_config[config_keys[i+1]]
-            
-            start_page = min(current_section["identified_pages"])
-            end_page = max(next_section["identified_pages"])
-            
-            current_section["page_ranges"] = list(range(start_page, end_page))
-            
-    section_pages = {section[0]: section[1]["page_ranges"] for section in processed_config.items() if "page_ranges" in section[1]}          
+def get_section_pages(page_texts: List[str], postings: Dict[str, List[int]], section_config: dict):
+    processed_config = identify_pages_from_config(page_texts, postings, section_config)
+    section_hits = {name: obj["identified_pages"] for name, obj in processed_config.items()}
+    logger.info(f"Identified section pages: {section_hits}")
+    
+    section_pages = resolve_section_ranges(section_hits, len(page_texts))
+    logger.info(f"Resolved section page ranges: {section_pages}")
+    
+    selected_sections = [
+        name for name in sorted(processed_config, key=natural_sort_key)
+        if 'selected' in processed_config[name]
+    ]
+    selected_clauses = [processed_config[name]['clause'] for name in selected_sections]
         
     return selected_sections, section_pages, selected_clauses
 
         
-def upload_supplier_pdf(local_report_path: str, supplier_pages: List[int], bucket: str, uid: str):
-    local_supplier_details_path = "/tmp/supplier_details.pdf"
-    remote_supplier_details_key = f"{uid}/processing/supplier_details.pdf"
-    
-    logger.info(f"inserting supplier pages into new document: {supplier_pages}")
-    with pymupdf.open(local_report_path) as doc:
-        new_doc = pymupdf.open()
-        for page_number in supplier_pages:
-            new_doc.insert_pdf(doc, from_page=page_number, to_page=page_number)
+def page_ranges(page_numbers: Iterable[int]) -> List[Tuple[int, int]]:
+    """
+    Collapse page numbers into half-open (start, stop) ranges of consecutive pages
+    """
+    ranges = []
+    for page_number in sorted(set(page_numbers)):
+        if ranges and page_number == ranges[-1][1]:
+            ranges[-1][1] = page_number + 1
+        else:
+            ranges.append([page_number, page_number + 1])
+    return [(start, stop) for start, stop in ranges]
+
+
+def build_section_pdf(doc: pymupdf.Document, name: str, ranges: List[Tuple[int, int]]) -> bytes:
+    ranges = [(start, min(stop, len(doc))) for start, stop in ranges if start < len(doc)]
+    logger.info(f"inserting {name} page ranges into new document: {ranges}")
+    new_doc = pymupdf.open()
+    for start, stop in ranges:
+        new_doc.insert_pdf(doc, from_page=start, to_page=stop - 1)
+    # no_new_id keeps the trailer /ID stable so the same pages always give the same bytes,
+    # which is what the Textract cache is keyed on
+    data = new_doc.tobytes(no_new_id=True)
+    new_doc.close()
+    return data
+
+
+def upload_pdf_bytes(data: bytes, bucket: str, key: str) -> None:
+    # upload_fileobj switches to multipart above TRANSFER_CONFIG.multipart_threshold
+    s3_client.upload_fileobj(io.BytesIO(data), bucket, key, Config=TRANSFER_CONFIG)
+
+
+def split_and_upload_pdfs(doc: pymupdf.Document, split_ranges: Dict[str, List[Tuple[int, int]]], remote_keys: Dict[str, str], bucket: str) -> Dict[str, str]:
+    """
+    Build one PDF per entry in split_ranges from the already open report,
+    copying each contiguous page range with a single insert_pdf call, and
+    hand each document to a bounded upload pool as soon as it is built.
+    PyMuPDF is not thread safe so documents are built on this thread only.
+    """
+    with ThreadPoolExecutor(max_workers=SPLIT_UPLOAD_WORKERS) as executor:
+        futures = {}
+        for name, ranges in split_ranges.items():
+            data = build_section_pdf(doc, name, ranges)
+            futures[name] = executor.submit(upload_pdf_bytes, data, bucket, remote_keys[name])
+        for future in futures.values():
+            future.result()
             
-        new_doc.save(local_supplier_details_path)
-        s3_client.upload_file(local_supplier_details_path, bucket, remote_supplier_details_key)
-        new_doc.close()
-        
-        supplier_uri = f"s3://{bucket}/{remote_supplier_details_key}"
-        
-    return supplier_uri
-        
+    return {name: f"s3://{bucket}/{remote_keys[name]}" for name in split_ranges}
 
-def upload_section_pdf(local_report_path: str, section:str, section_pages: List[int], bucket: str, uid: str):
-    local_nc_path = f"/tmp/{section}.pdf"
-    remote_nc_key = f"{uid}/processing/{section}_nc.pdf"
-    
-    logger.info(f"insering {section} pages into new document: {section_pages}")
-    with pymupdf.open(local_report_path) as doc:
-        new_doc = pymupdf.open()
-        for page_number in section_pages:
-            new_doc.insert_pdf(doc, from_page=page_number, to_page=page_number)
-        new_doc.save(local_nc_path)
-        s3_client.upload_file(local_nc_path, bucket, remote_nc_key)
-        new_doc.close()
-        nc_uri = f"s3://{bucket}/{remote_nc_key}"
-        
-    return nc_uri
 
 def split_report(bucket: str, key: str, import_uid: str):
-    local_report_path = download_report(bucket, key)
-    supplier_pages = get_supplier_pages(local_report_path)
-    sections, section_pages, clauses= get_section_pages(bucket,local_report_path,import_uid)
-    supplier_uri = upload_supplier_pdf(local_report_path, supplier_pages, bucket, import_uid)
-    nc_uri_list = [ ]
+    doc, local_report_path = open_report(bucket, key)
+    try:
+        return split_document(doc, bucket, import_uid)
+    finally:
+        doc.close()
+        if local_report_path:
+            os.remove(local_report_path)
+
+
+def split_document(doc: pymupdf.Document, bucket: str, import_uid: str):
+    page_texts = build_page_text_index(doc)
+    if SAVE_PAGE_TEXT_INDEX:
+        index_uri = upload_page_text_index(page_texts, bucket, import_uid)
+        logger.info(f"Saved page text index to {index_uri}")
+    supplier_config = load_supplier_config()
+    section_config = load_section_config(bucket, import_uid)
+    # one pass over every page for the union of supplier and section search terms
+    matcher = compile_search_terms(supplier_config, section_config)
+    postings = matcher.index(page_texts)
+    supplier_pages = get_supplier_pages(page_texts, postings, supplier_config)
+    sections, section_pages, clauses= get_section_pages(page_texts, postings, section_config)
+    
     for x in sections:
-        
         if x not in section_pages.keys():
             logger.info(f"{x} missing from section pages object\nsection pages: {section_pages}")
             raise ValueError(f"Unable to locate {x} in report")
-            
-        current_clause = clauses[sections.index(x)]
-        current_section_pages = section_pages[x]
-        nc_uri = upload_section_pdf(local_report_path, x, current_section_pages, bucket, import_uid)
-        print(nc_uri)
-        dict_entry = {
+    
+    split_ranges = {"supplier_details": page_ranges(supplier_pages)}
+    remote_keys = {"supplier_details": f"{import_uid}/processing/supplier_details.pdf"}
+    for x in sections:
+        split_ranges[x] = [section_pages[x]]
+        remote_keys[x] = f"{import_uid}/processing/{x}_nc.pdf"
+    
+    uris = split_and_upload_pdfs(doc, split_ranges, remote_keys, bucket)
+    
+    supplier_uri = uris["supplier_details"]
+    nc_uri_list = [
+        {
             "section": x,
-            "clause": current_clause,
-            "nc_uri":nc_uri
+            "clause": clauses[i],
+            "nc_uri": uris[x]
         }
-        nc_uri_list.append(dict_entry)
+        for i, x in enumerate(sections)
+    ]
+    logger.info(f"Uploaded sections: {nc_uri_list}")
 
     return supplier_uri, nc_uri_list
-    
\ No newline at end of file
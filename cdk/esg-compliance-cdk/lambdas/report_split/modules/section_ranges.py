@@ -0,0 +1,65 @@
+import logging
+import re
+from bisect import bisect_right
+from collections import Counter
+from typing import Dict, List, Sequence, Tuple
+
+logger = logging.getLogger(__file__)
+logger.setLevel(logging.INFO)
+
+
+def natural_sort_key(name: str) -> list:
+    """
+    Order section keys the way they appear in the report, e.g. section2 before section10a
+    """
+    return [int(part) if part.isdigit() else part for part in re.split(r"(\d+)", name.lower())]
+
+
+def resolve_section_starts(ordered_hits: Sequence[Tuple[str, Sequence[int]]]) -> Dict[str, int]:
+    """
+    Walk the sections in report order and give each the first candidate page
+    after the previous section's start, so starts are strictly increasing and
+    stray mentions of a heading earlier or later in the report are skipped.
+    Sections with no candidate after their predecessor are left unresolved.
+    """
+    starts = {}
+    previous = -1
+    for name, hits in ordered_hits:
+        idx = bisect_right(hits, previous)
+        if idx < len(hits):
+            previous = hits[idx]
+            starts[name] = previous
+    return starts
+
+
+def drop_shared_pages(section_hits: Dict[str, List[int]]) -> Dict[str, List[int]]:
+    """
+    Pages matched by several sections are usually a contents or summary page,
+    so ignore them for any section that has another candidate
+    """
+    counts = Counter(page for hits in section_hits.values() for page in set(hits))
+    filtered = {}
+    for name, hits in section_hits.items():
+        own_hits = [page for page in hits if counts[page] == 1]
+        filtered[name] = sorted(own_hits or hits)
+    return filtered
+
+
+def resolve_section_ranges(section_hits: Dict[str, List[int]], page_count: int) -> Dict[str, Tuple[int, int]]:
+    """
+    Turn the identified pages of each section into half-open (start, stop)
+    page ranges, where a section stops at the start of the next resolved one
+    """
+    order = sorted(section_hits, key=natural_sort_key)
+    candidates = drop_shared_pages(section_hits)
+    starts = resolve_section_starts([(name, candidates[name]) for name in order])
+
+    if unresolved := [name for name in order if name not in starts]:
+        logger.info(f"Could not place the following sections in report order: {unresolved}")
+
+    resolved = [name for name in order if name in starts]
+    ranges = {}
+    for current, following in zip(resolved, resolved[1:] + [None]):
+        stop = starts[following] if following else page_count
+        ranges[current] = (starts[current], stop)
+    return ranges
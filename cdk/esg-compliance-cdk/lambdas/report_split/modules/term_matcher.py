@@ -0,0 +1,39 @@
+from typing import Dict, Iterable, List, Optional, Sequence
+
+
+class TermMatcher:
+    """
+    Compiled set of search terms shared by one or more page configs.
+
+    Every unique term is looked for once per page with a plain substring check
+    and recorded in a term -> pages posting list, so config entries are resolved by
+    intersecting postings rather than re-scanning each page for every entry and term.
+    This removes repeated scans for terms shared between entries and configs; it is
+    not a single-pass multi-pattern matcher.
+    """
+    def __init__(self, terms: Iterable[str]):
+        self.terms = list(dict.fromkeys(term for term in terms if term is not None))
+
+    def index(self, texts: Sequence[str]) -> Dict[str, List[int]]:
+        postings = {term: [] for term in self.terms}
+        for number, text in enumerate(texts):
+            for term in self.terms:
+                if term in text:
+                    postings[term].append(number)
+        return postings
+
+    @staticmethod
+    def match_all(postings: Dict[str, List[int]], terms: Optional[List[str]], page_count: int) -> List[int]:
+        if not terms:
+            return list(range(page_count))
+        pages = set(postings[terms[0]])
+        for term in terms[1:]:
+            pages.intersection_update(postings[term])
+        return sorted(pages)
+
+    @staticmethod
+    def match_any(postings: Dict[str, List[int]], terms: Optional[List[str]]) -> List[int]:
+        pages = set()
+        for term in terms or []:
+            pages.update(postings[term])
+        return sorted(pages)
@@ -0,0 +1,119 @@
+import json
+import logging
+import os
+from datetime import datetime, timezone
+
+import boto3
+
+logger = logging.getLogger(__file__)
+logger.setLevel(logging.INFO)
+
+ddb = boto3.client('dynamodb')
+status_table = os.environ['STATUS_TABLE']
+
+# sort key shared with modules/progress.py in the pipeline lambdas
+EXECUTION_RECORD = "execution"
+FAILED_STATUSES = ("FAILED", "TIMED_OUT", "ABORTED")
+
+
+def epoch_millis_to_iso(value):
+    return datetime.fromtimestamp(value / 1000, tz=timezone.utc).isoformat()
+
+
+def fail_running_stages(import_uid, status, stopped_at):
+    """
+    Mark the stage items still running as failed. Lambdas record their own failures, but
+    a timed out or aborted invocation never gets the chance to.
+    """
+    paginator = ddb.get_paginator('query')
+    pages = paginator.paginate(
+        TableName=status_table,
+        KeyConditionExpression="#uid = :uid AND begins_with(#record, :stage)",
+        FilterExpression="#status = :running",
+        ExpressionAttributeNames={'#uid': 'Import Uid', '#record': 'Record', '#status': 'Status'},
+        ExpressionAttributeValues={':uid': {'S': import_uid}, ':stage': {'S': 'stage#'}, ':running': {'S': 'running'}},
+        ConsistentRead=True,
+    )
+    for page in pages:
+        for item in page['Items']:
+            values = {
+                ':failed': {'S': 'failed'},
+                ':running': {'S': 'running'},
+                ':ended': {'S': stopped_at.isoformat()},
+                ':error': {'S': f"Execution {status}"},
+            }
+            update_expression = "SET #status = :failed, #ended = :ended, #error = :error"
+            names = {'#status': 'Status', '#ended': 'Ended At', '#error': 'Error'}
+            if 'Started At' in item:
+                started_at = datetime.fromisoformat(item['Started At']['S'])
+                update_expression += ", #duration = :duration"
+                names['#duration'] = 'Duration Ms'
+                values[':duration'] = {'N': str(max(0, int((stopped_at - started_at).total_seconds() * 1000)))}
+            try:
+                ddb.update_item(
+                    TableName=status_table,
+                    Key={'Import Uid': item['Import Uid'], 'Record': item['Record']},
+                    UpdateExpression=update_expression,
+                    # the stage may have finished since the query
+                    ConditionExpression="#status = :running",
+                    ExpressionAttributeNames=names,
+                    ExpressionAttributeValues=values,
+                )
+            except ddb.exceptions.ConditionalCheckFailedException:
+                pass
+
+
+def handler(event, context):
+    """
+    Mirror a Step Functions execution status change onto the import's execution item,
+    bumping its Version so the upload page notices the change
+    """
+    detail = event["detail"]
+    execution_input = json.loads(detail.get("input") or "{}")
+    # executions are started by the S3 Object Created event for {import_uid}/inputs/{report}
+    key = execution_input["detail"]["object"]["key"]
+    import_uid = key.split('/')[0]
+    
+    values = {
+        ':status': {'S': detail["status"]},
+        ':arn': {'S': detail["executionArn"]},
+        ':updated': {'S': datetime.now(timezone.utc).isoformat()},
+        ':one': {'N': '1'},
+    }
+    update_expression = "SET #status = :status, #arn = :arn, #updated = :updated"
+    names = {'#status': 'Status', '#arn': 'Execution Arn', '#updated': 'Updated At'}
+    if detail.get("startDate"):
+        update_expression += ", #started = :started"
+        names['#started'] = 'Started At'
+        values[':started'] = {'S': epoch_millis_to_iso(detail["startDate"])}
+    if detail.get("stopDate"):
+        update_expression += ", #stopped = :stopped"
+        names['#stopped'] = 'Stopped At'
+        values[':stopped'] = {'S': epoch_millis_to_iso(detail["stopDate"])}
+    
+    update = {
+        'TableName': status_table,
+        'Key': {'Import Uid': {'S': import_uid}, 'Record': {'S': EXECUTION_RECORD}},
+        'UpdateExpression': update_expression + " ADD Version :one",
+        'ExpressionAttributeNames': names,
+        'ExpressionAttributeValues': values,
+    }
+    if detail["status"] == "RUNNING":
+        # events are not ordered, never move a finished execution back to RUNNING
+        update['ConditionExpression'] = "attribute_not_exists(#status) OR #status = :status"
+    
+    logger.info(f"Execution {detail['executionArn']} for {import_uid} is {detail['status']}")
+    if detail["status"] in FAILED_STATUSES:
+        # before the Version bump below, so the upload page reads the failed stages with it
+        stopped_at = datetime.fromtimestamp(detail["stopDate"] / 1000, tz=timezone.utc) if detail.get("stopDate") else datetime.now(timezone.utc)
+        fail_running_stages(import_uid, detail["status"], stopped_at)
+    
+    try:
+        ddb.update_item(**update)
+    except ddb.exceptions.ConditionalCheckFailedException:
+        logger.info(f"Ignoring late RUNNING event for {import_uid}")
+    
+    return {
+        'statusCode': 200,
+        'body': f'Status {detail["status"]} recorded for {import_uid}'
+    }
@@ -1,3 +1,4 @@
+import os
 from typing import Dict
 
 import boto3
@@ -6,19 +7,31 @@ import pandas as pd
 from textractcaller.t_call import call_textract, Textract_Features
 from textractor import Textractor
 from textractor.data.constants import TextractFeatures
+from textractor.entities.document import Document
 
 from modules import tables, partition_keys
+from modules.textract_cache import TextractCache
 
+textract_cache = TextractCache(s3_client=boto3.client("s3"), bucket=os.getenv("TEXTRACT_CACHE_BUCKET"))
 
-def get_supplier_form_details(supplier_uri: str) -> Dict:
+
+def analyse_supplier_document(supplier_uri: str) -> Document:
     extractor = Textractor()
     
-    document = extractor.start_document_analysis(
-        file_source=supplier_uri,
-        features=[TextractFeatures.FORMS],
-        save_image=False
+    # one Textract job covers both the form and the table extractors
+    features = [TextractFeatures.FORMS, TextractFeatures.TABLES]
+    textract_response = textract_cache.analyse(
+        document_uri=supplier_uri,
+        features=features,
+        analyse=lambda: extractor.start_document_analysis(
+            file_source=supplier_uri,
+            features=features,
+            save_image=False
+        ).response
     )
-    
+    return Document.open(textract_response)
+
+def get_supplier_form_details(document: Document) -> Dict:
     form_keys = [
         "Site Name",
         "Company Name",
@@ -52,15 +65,7 @@ def get_supplier_form_details(supplier_uri: str) -> Dict:
     
     return factory_details
 
-def get_supplier_table_details(supplier_uri: str):
-    extractor = Textractor()
-
-    document = extractor.start_document_analysis(
-        file_source=supplier_uri,
-        features=[TextractFeatures.TABLES],
-        save_image=False
-    )
-    
+def get_supplier_table_details(document: Document):
     tables_of_interest = {}
     # Currently neglects audit attendance table due to lack of table title in the audit
     for table in document.tables:
@@ -86,8 +91,9 @@ def get_supplier_table_details(supplier_uri: str):
     return tables_combined
 
 def get_supplier_details(supplier_uri: str) -> Dict:
-    form_data = get_supplier_form_details(supplier_uri=supplier_uri)
-    table_data = get_supplier_table_details(supplier_uri=supplier_uri)
+    document = analyse_supplier_document(supplier_uri=supplier_uri)
+    form_data = get_supplier_form_details(document=document)
+    table_data = get_supplier_table_details(document=document)
     
     return {**form_data, **table_data}
     
@@ -1,58 +1,156 @@
 import json
 import boto3
-import csv 
-from io import StringIO
-import os 
+import codecs
+import csv
+import os
 import re
+import tempfile
+
+from langchain_community.embeddings import BedrockEmbeddings
+from langchain_community.vectorstores.faiss import FAISS
 
 table_name = os.environ["GRADINGS_TABLE"]
+# kept outside the gradings/ prefix so writing them does not retrigger this lambda
+catalogue_snapshot_key = "catalogue/gradings.jsonl"
+faiss_index_prefix = "catalogue/faiss"
+embedding_model_id = "cohere.embed-english-v3"
+key_attributes = ("No", "Category")
+
+whitespace_pattern = re.compile(r'\s+')
+slash_pattern = re.compile(r'\s*/\s*')
+hyphen_pattern = re.compile(r'\s*-\s*')
 
 def standardise_text(text):
     if text is None:
         return None
     # Remove extra spaces
-    text = re.sub(r'\s+', ' ', text.strip())
+    text = whitespace_pattern.sub(' ', text.strip())
     # Remove spaces before and after slashes
-    text = re.sub(r'\s*/\s*', '/', text)
+    text = slash_pattern.sub('/', text)
     # Remove spaces around hyphens
-    text = re.sub(r'\s*-\s*', '-', text)
+    text = hyphen_pattern.sub('-', text)
     return text
 
-def csv_to_dynamodb(s3_bucket,s3_key, table_name):
-    
-    s3 = boto3.client('s3')
-    dynamodb = boto3.resource('dynamodb')
-    table = dynamodb.Table(table_name)
-    print(s3_key)
-    response = s3.get_object(Bucket=s3_bucket, Key = s3_key)
-    csv_content = response['Body'].read().decode('utf-8')
-    csv_file = StringIO(csv_content)
-    csv_reader = csv.DictReader(csv_file)
-    
+def scan_catalogue(table):
+    response = table.scan()
+    items = response['Items']
+    while 'LastEvaluatedKey' in response:
+        response = table.scan(ExclusiveStartKey=response['LastEvaluatedKey'])
+        items.extend(response['Items'])
+    return {tuple(item.get(key) for key in key_attributes): item for item in items}
+
+def iter_csv_items(body):
+    """
+    Stream the CSV straight from the S3 body, yielding one standardised item per row
+    """
+    # utf-8-sig drops the byte order mark Excel puts in front of the first header
+    csv_reader = csv.DictReader(codecs.getreader('utf-8-sig')(body))
     for row in csv_reader:
         item = {}
         for key,value in row.items():
-            
+            if key is None:
+                continue
+
             clean_key = key.lstrip('\ufeff')
 
-            if value == '':
+            if value == '' or value is None:
                 item[clean_key] = None
-            
+
             else:
                 standardized_value = standardise_text(value)
                 item[clean_key] = standardized_value
-        print(item)
-        table.put_item(Item=item)
-# print(f"Data from  has been uploaded to {table_name} table.")
+        yield item
+
+def csv_to_dynamodb(s3_bucket,s3_key, table_name):
+
+    s3 = boto3.client('s3')
+    dynamodb = boto3.resource('dynamodb')
+    table = dynamodb.Table(table_name)
+    print(s3_key)
+
+    catalogue = scan_catalogue(table)
+    response = s3.get_object(Bucket=s3_bucket, Key = s3_key)
+
+    summary = {"inserted": 0, "updated": 0, "unchanged": 0, "duplicate": 0, "missing_key": 0}
+    seen_keys = set()
+
+    with table.batch_writer(overwrite_by_pkeys=list(key_attributes)) as batch:
+        for item in iter_csv_items(response['Body']):
+            key = tuple(item.get(attribute) for attribute in key_attributes)
+
+            if None in key:
+                summary["missing_key"] += 1
+                continue
+            if key in seen_keys:
+                summary["duplicate"] += 1
+                continue
+            seen_keys.add(key)
+
+            if key not in catalogue:
+                summary["inserted"] += 1
+            elif catalogue[key] != item:
+                summary["updated"] += 1
+            else:
+                summary["unchanged"] += 1
+                continue
+
+            catalogue[key] = item
+            batch.put_item(Item=item)
+
+    summary["skipped"] = summary["unchanged"] + summary["duplicate"] + summary["missing_key"]
+    print(f"Ingested {s3_key} into {table_name}: {summary}")
+
+    items = list(catalogue.values())
+    write_catalogue_snapshot(s3, s3_bucket, items)
+    build_grading_index(s3, s3_bucket, items)
+
+    return summary
+
+def write_catalogue_snapshot(s3, s3_bucket, items):
+    """
+    Store the whole catalogue as JSON Lines so downstream lambdas can load it with
+    one GET, and use its ETag as the catalogue version
+    """
+    body = '\n'.join(json.dumps(item, default=str) for item in items)
+    s3.put_object(
+        Bucket=s3_bucket,
+        Key=catalogue_snapshot_key,
+        Body=body.encode('utf-8'),
+        ContentType='application/x-ndjson'
+    )
+    print(f"Stored snapshot of {len(items)} gradings in s3://{s3_bucket}/{catalogue_snapshot_key}")
+
+def build_grading_index(s3, s3_bucket, items):
+    """
+    Embed every issue title in the catalogue once and store the FAISS index
+    in the gradings bucket for validate_unrated_issues to load
+    """
+    issues = [item.get('Issue Title') or 'no issue' for item in items]
+    metadata = [
+        {
+            'issue': issue,
+            'rating': item.get('Updated Grading') or 'no rating',
+            'timeframe': item.get('Resolution Window') or 'no timeline'
+        }
+        for issue, item in zip(issues, items)
+    ]
+
+    embeddings = BedrockEmbeddings(client=boto3.client('bedrock-runtime'), model_id=embedding_model_id)
+    vector_db = FAISS.from_texts(issues, embeddings, metadatas=metadata)
+
+    with tempfile.TemporaryDirectory() as index_dir:
+        vector_db.save_local(index_dir)
+        for file_name in ["index.pkl", "index.faiss"]:
+            s3.upload_file(os.path.join(index_dir, file_name), s3_bucket, f"{faiss_index_prefix}/{file_name}")
+    print(f"Stored FAISS index of {len(issues)} gradings in s3://{s3_bucket}/{faiss_index_prefix}")
 
 def handler(event, context):
-    # TODO implement
-    
+
     print(event)
     s3_bucket = event['Records'][0]['s3']['bucket']['name']
     s3_key = event['Records'][0]['s3']['object']['key']
-    csv_to_dynamodb(s3_bucket,s3_key,table_name)
+    summary = csv_to_dynamodb(s3_bucket,s3_key,table_name)
     return {
         'statusCode': 200,
-        'body': json.dumps('Hello from Lambda!')
+        'body': json.dumps(summary)
     }
@@ -1,21 +1,40 @@
+import json
 import os
+import tempfile
 import boto3
 import faiss
+import numpy as np
+from botocore.exceptions import ClientError
 from langchain_community.embeddings import BedrockEmbeddings
 from langchain_community.vectorstores.faiss import FAISS
+from modules.batch_writer import BatchItemWriter
+from modules.progress import ProgressRecorder, import_uid_from_uri
 
 br= boto3.client('bedrock')
 bedrock = boto3.client('bedrock-runtime')
 ddb = boto3.client('dynamodb')
+s3_client = boto3.client('s3')
 
 compliance_grading_table = os.environ['GRADINGS_TABLE']
 supplier_table = os.environ['SUPPLIER_TABLE']
+gradings_bucket = os.environ.get('GRADINGS_BUCKET')
+progress = ProgressRecorder(ddb, os.environ.get('STATUS_TABLE'))
+
+embedding_model_id = 'cohere.embed-english-v3'
+EMBED_BATCH_SIZE = 96
+
+# written by upload_grading whenever a new gradings CSV is ingested
+faiss_index_prefix = "catalogue/faiss"
+
+# reused across invocations of a warm container
+cached_vector_db = None
+cached_vector_db_version = None
       
 def get_dynamo_db_data(table_name):
-    response = ddb.scan(
-        TableName=table_name
-    )  
-    items = response['Items']
+    items = []
+    paginator = ddb.get_paginator('scan')
+    for page in paginator.paginate(TableName=table_name):
+        items.extend(page['Items'])
 
     ratings_tuples = [
     (
@@ -29,7 +48,7 @@ def get_dynamo_db_data(table_name):
     return ratings_tuples
         
 def generate_embeddings(ratings_tuples):
-    embeddings = BedrockEmbeddings(client=bedrock,model_id='cohere.embed-english-v3')
+    embeddings = BedrockEmbeddings(client=bedrock,model_id=embedding_model_id)
     
     issues = [rating[0] for rating in ratings_tuples]
     ratings = [rating[1] for rating in ratings_tuples]
@@ -39,37 +58,117 @@ def generate_embeddings(ratings_tuples):
     vector_db = FAISS.from_texts(issues, embeddings, metadatas=metadata)
     return vector_db
         
-def get_closest(vector_db, issue_title):
-    query = f"Which issue title is the closest match to this: {issue_title}"
-    closest_issue = vector_db.similarity_search(query,k=1)
-    issue_dict = closest_issue[0].metadata
-    return issue_dict
+def get_index_version():
+    if not gradings_bucket:
+        return None
+    try:
+        response = s3_client.head_object(Bucket=gradings_bucket, Key=f"{faiss_index_prefix}/index.faiss")
+    except ClientError as e:
+        if e.response['Error']['Code'] in ('404', 'NoSuchKey'):
+            return None
+        raise e
+    return response['ETag']
 
-def add_issue_to_dynamodb(supplier_table, ddb_entry):
+def load_vector_db():
+    """
+    Load the grading index built by upload_grading, keeping it for the life of the
+    container until its ETag changes. Falls back to embedding the gradings table
+    when no index has been stored yet.
+    """
+    global cached_vector_db, cached_vector_db_version
     
-    response = ddb.put_item(
-        TableName=supplier_table,
-        Item=ddb_entry
-    )
-    return response
+    version = get_index_version()
+    if cached_vector_db is not None and version == cached_vector_db_version:
+        return cached_vector_db
+    
+    if version is None:
+        print("No stored grading index found, embedding the gradings table")
+        vector_db = generate_embeddings(get_dynamo_db_data(compliance_grading_table))
+    else:
+        embeddings = BedrockEmbeddings(client=bedrock,model_id=embedding_model_id)
+        with tempfile.TemporaryDirectory() as index_dir:
+            for file_name in ["index.faiss", "index.pkl"]:
+                s3_client.download_file(gradings_bucket, f"{faiss_index_prefix}/{file_name}", os.path.join(index_dir, file_name))
+            # the index is written by upload_grading into our own bucket
+            vector_db = FAISS.load_local(index_dir, embeddings, allow_dangerous_deserialization=True)
+        print(f"Loaded grading index version {version}")
+    
+    cached_vector_db = vector_db
+    cached_vector_db_version = version
+    return vector_db
+        
+def embed_queries(queries):
+    """
+    Embed all queries with as few Bedrock calls as possible (Cohere accepts up to
+    EMBED_BATCH_SIZE texts per request)
+    """
+    vectors = []
+    for start in range(0, len(queries), EMBED_BATCH_SIZE):
+        body = json.dumps({
+            "texts": queries[start:start+EMBED_BATCH_SIZE],
+            "input_type": "search_query"
+        })
+        response = bedrock.invoke_model(
+            body=body,
+            modelId=embedding_model_id,
+            accept="application/json",
+            contentType="application/json",
+        )
+        vectors.extend(json.loads(response['body'].read())['embeddings'])
+    return np.array(vectors, dtype=np.float32)
+
+def get_closest(vector_db, issue_titles, k=2):
+    """
+    Search the grading index for every issue title in a single matrix query and
+    return the best match, its distance (lower is closer) and the runner-up per issue
+    """
+    queries = [f"Which issue title is the closest match to this: {issue_title}" for issue_title in issue_titles]
+    distances, indices = vector_db.index.search(embed_queries(queries), k)
+    
+    closest = []
+    for row_distances, row_indices in zip(distances, indices):
+        matches = [
+            vector_db.docstore.search(vector_db.index_to_docstore_id[i]).metadata
+            for i in row_indices if i != -1
+        ]
+        closest.append({
+            "best": matches[0],
+            "score": float(row_distances[0]),
+            "runner_up": matches[1] if len(matches) > 1 else None,
+            "runner_up_score": float(row_distances[1]) if len(matches) > 1 else None
+        })
+    return closest
+
+@progress.reports_failures
 def handler(event,context):
     
     clause = event['clause']
     company_name = event['company_name']
     audit_date = event["audit_date"]
     unrated_issues = event['unrated_issues']
+    run = progress.start(import_uid_from_uri(event['nc_uri']), "validate", section=event['section'])
     
-    ratings_tuples = get_dynamo_db_data(compliance_grading_table)
-    vector_db = generate_embeddings(ratings_tuples)
+    vector_db = load_vector_db()
+    closest_issues = get_closest(vector_db, [issue[2] for issue in unrated_issues]) if unrated_issues else []
+    matches = []
+    writer = BatchItemWriter(ddb, supplier_table)
     
-    for issue in unrated_issues:
+    for issue, closest in zip(unrated_issues, closest_issues):
         audit_date_issue_no=issue[0]
         nc_observation = issue[1]
         issue_title=issue[2]
         explanation=issue[3]
         timescale=issue[4]
         
-        issue_dict = get_closest(vector_db, issue_title)
+        issue_dict = closest['best']
+        print(f"{issue_title} -> {issue_dict['issue']} (score {closest['score']}), runner-up {closest['runner_up']}")
+        matches.append({
+            "issue_title": issue_title,
+            "matched_issue": issue_dict['issue'],
+            "score": closest['score'],
+            "runner_up": closest['runner_up']['issue'] if closest['runner_up'] else None,
+            "runner_up_score": closest['runner_up_score']
+        })
         
         esg_remediation_timescale = issue_dict['timeframe']
         rating = issue_dict['rating']
@@ -108,11 +207,16 @@ def handler(event,context):
                 'Timescales Match': {'S': 'No'},
             }
         
-        add_issue_to_dynamodb(supplier_table, ddb_entry)
-        
+        writer.put(ddb_entry)
+    
+    failed_writes = writer.flush()
+    progress.finish(run, counts={"unrated": len(unrated_issues), "failed_writes": len(failed_writes)})
+
     return {
         "company_name": company_name,
         "audit_date": audit_date,
+        "matches": matches,
+        "count_failed_writes": len(failed_writes),
     }
     
         
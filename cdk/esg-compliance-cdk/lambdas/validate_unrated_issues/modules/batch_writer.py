@@ -0,0 +1,66 @@
+import json
+import logging
+import random
+import time
+from typing import Dict, List, Sequence
+
+logger = logging.getLogger(__file__)
+logger.setLevel(logging.INFO)
+
+# BatchWriteItem accepts at most 25 put requests per call
+BATCH_SIZE = 25
+
+
+class BatchItemWriter:
+    """
+    Buffers low-level DynamoDB items and writes them with BatchWriteItem in
+    chunks of 25, retrying UnprocessedItems with exponential backoff.
+    Items that are still unprocessed after max_attempts are returned by flush.
+    """
+    def __init__(
+        self,
+        ddb_client,
+        table_name: str,
+        key_attributes: Sequence[str] = ("Company Name", "AuditDateIssueNumber"),
+        max_attempts: int = 6,
+        base_delay: float = 0.1,
+    ):
+        self.ddb_client = ddb_client
+        self.table_name = table_name
+        self.key_attributes = key_attributes
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        # keyed by primary key as BatchWriteItem rejects duplicate keys in one call
+        self.items = {}
+        self.failed = []
+
+    def put(self, item: Dict) -> None:
+        key = tuple(json.dumps(item[attribute], sort_keys=True) for attribute in self.key_attributes)
+        self.items[key] = item
+
+    def flush(self) -> List[Dict]:
+        items = list(self.items.values())
+        self.items = {}
+        failed = []
+        for start in range(0, len(items), BATCH_SIZE):
+            failed.extend(self.write_batch(items[start:start+BATCH_SIZE]))
+
+        for item in failed:
+            logger.error(f"Failed to write item to {self.table_name}: {item}")
+        if items:
+            logger.info(f"Wrote {len(items) - len(failed)}/{len(items)} items to {self.table_name}")
+        self.failed.extend(failed)
+        return failed
+
+    def write_batch(self, items: List[Dict]) -> List[Dict]:
+        requests = [{"PutRequest": {"Item": item}} for item in items]
+        for attempt in range(self.max_attempts):
+            if attempt:
+                time.sleep(self.base_delay * 2 ** (attempt - 1) * (1 + random.random()))
+            response = self.ddb_client.batch_write_item(RequestItems={self.table_name: requests})
+            requests = response.get("UnprocessedItems", {}).get(self.table_name, [])
+            if not requests:
+                return []
+            logger.info(f"{len(requests)} items unprocessed on attempt {attempt + 1}, retrying")
+
+        return [request["PutRequest"]["Item"] for request in requests]
@@ -0,0 +1,79 @@
+import importlib.util
+import os
+
+CDK_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+MODULE_PATH = os.path.join(CDK_ROOT, "lambdas", "extract_nc", "modules", "batch_writer.py")
+
+spec = importlib.util.spec_from_file_location("batch_writer", MODULE_PATH)
+batch_writer = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(batch_writer)
+BatchItemWriter = batch_writer.BatchItemWriter
+
+
+class StubDynamoDB:
+    """Leaves the first `unprocessed[i]` requests of call i unprocessed"""
+    def __init__(self, unprocessed=()):
+        self.unprocessed = list(unprocessed)
+        self.calls = []
+
+    def batch_write_item(self, RequestItems):
+        (table, requests), = RequestItems.items()
+        self.calls.append([request["PutRequest"]["Item"]["AuditDateIssueNumber"]["S"] for request in requests])
+        count = self.unprocessed.pop(0) if self.unprocessed else 0
+        if not count:
+            return {"UnprocessedItems": {}}
+        return {"UnprocessedItems": {table: requests[:count]}}
+
+
+def item(number):
+    return {"Company Name": {"S": "Acme"}, "AuditDateIssueNumber": {"S": f"2024-03-01-section3#{number}"}}
+
+
+def writer_for(client, monkeypatch, max_attempts=6):
+    delays = []
+    monkeypatch.setattr(batch_writer.time, "sleep", delays.append)
+    return BatchItemWriter(client, "supplier-table", max_attempts=max_attempts), delays
+
+
+def test_items_are_written_in_batches_of_25_without_duplicate_keys(monkeypatch):
+    client = StubDynamoDB()
+    writer, delays = writer_for(client, monkeypatch)
+
+    for number in range(30):
+        writer.put(item(number))
+    writer.put(item(0))
+
+    assert writer.flush() == []
+    assert [len(call) for call in client.calls] == [25, 5]
+    assert delays == []
+
+
+def test_unprocessed_items_are_retried_until_written(monkeypatch):
+    # partial success, then the retry of the rest partly fails again, then succeeds
+    client = StubDynamoDB(unprocessed=[3, 1])
+    writer, delays = writer_for(client, monkeypatch)
+
+    for number in range(5):
+        writer.put(item(number))
+
+    assert writer.flush() == []
+    assert [len(call) for call in client.calls] == [5, 3, 1]
+    assert client.calls[1] == client.calls[0][:3]
+    assert len(delays) == 2
+    # exponential backoff with jitter: base * 2**(attempt-1) * [1, 2)
+    assert 0.1 <= delays[0] < 0.2 and 0.2 <= delays[1] < 0.4
+
+
+def test_items_still_unprocessed_after_the_last_attempt_are_returned(monkeypatch):
+    client = StubDynamoDB(unprocessed=[2, 2, 2])
+    writer, delays = writer_for(client, monkeypatch, max_attempts=3)
+
+    for number in range(4):
+        writer.put(item(number))
+
+    failed = writer.flush()
+
+    assert failed == [item(0), item(1)]
+    assert writer.failed == failed
+    assert len(client.calls) == 3
+    assert len(delays) == 2
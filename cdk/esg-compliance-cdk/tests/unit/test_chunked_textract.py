@@ -0,0 +1,50 @@
+import importlib.util
+import os
+import sys
+
+import pytest
+
+pytest.importorskip("pymupdf")
+pytest.importorskip("textractcaller")
+
+CDK_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+LAMBDA_ROOT = os.path.join(CDK_ROOT, "lambdas", "extract_nc")
+MODULE_PATH = os.path.join(LAMBDA_ROOT, "modules", "chunked_textract.py")
+sys.path.insert(0, LAMBDA_ROOT)
+
+spec = importlib.util.spec_from_file_location("chunked_textract", MODULE_PATH)
+chunked_textract = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(chunked_textract)
+
+
+def chunk_response(pages):
+    return {
+        "DocumentMetadata": {"Pages": pages},
+        "JobStatus": "SUCCEEDED",
+        "Blocks": [{"Id": f"{page}", "BlockType": "PAGE", "Page": page} for page in range(1, pages + 1)],
+    }
+
+
+def test_merge_responses_renumbers_pages():
+    merged = chunked_textract.merge_responses([chunk_response(2), chunk_response(2), chunk_response(1)], chunk_size=2)
+
+    assert merged["DocumentMetadata"] == {"Pages": 5}
+    assert [block["Page"] for block in merged["Blocks"]] == [1, 2, 3, 4, 5]
+    assert merged["JobStatus"] == "SUCCEEDED"
+
+
+def test_split_pdf_chunks_pages():
+    import pymupdf
+
+    with pymupdf.open() as doc:
+        for _ in range(5):
+            doc.new_page()
+        document = doc.tobytes()
+
+    chunks = chunked_textract.split_pdf(document, chunk_size=2)
+
+    page_counts = []
+    for chunk in chunks:
+        with pymupdf.open(stream=chunk, filetype="pdf") as doc:
+            page_counts.append(doc.page_count)
+    assert page_counts == [2, 2, 1]
@@ -0,0 +1,209 @@
+import importlib.util
+import json
+import os
+import re
+import sys
+import time
+
+import pytest
+
+pytest.importorskip("boto3")
+pytest.importorskip("rapidfuzz")
+pytest.importorskip("pymupdf")
+pytest.importorskip("textractcaller")
+trp = pytest.importorskip("trp")
+
+CDK_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+LAMBDA_ROOT = os.path.join(CDK_ROOT, "lambdas", "extract_nc")
+MODULE_PATH = os.path.join(LAMBDA_ROOT, "lambda_function.py")
+# the handler imports its modules the way the lambda runtime does
+sys.path.insert(0, LAMBDA_ROOT)
+os.environ.setdefault("AWS_DEFAULT_REGION", "eu-west-2")
+os.environ.setdefault("SUPPLIER_TABLE", "supplier-table")
+os.environ.setdefault("GRADINGS_TABLE", "gradings-table")
+
+spec = importlib.util.spec_from_file_location("extract_nc", MODULE_PATH)
+extract_nc = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(extract_nc)
+
+
+def geometry(top, height=0.02, left=0.1, width=0.8):
+    return {"BoundingBox": {"Top": top, "Height": height, "Left": left, "Width": width}, "Polygon": []}
+
+
+class SyntheticDocument:
+    """Builds Textract blocks for trp, page content ordered top to bottom like order_blocks_by_geo"""
+    def __init__(self):
+        self.pages = []
+        self.blocks = []
+
+    def block(self, block_type, top, height=0.02, left=0.1, width=0.8, **fields):
+        block = {"BlockType": block_type, "Id": f"b{len(self.blocks)}", "Confidence": 99.0, "Geometry": geometry(top, height, left, width), **fields}
+        self.blocks.append(block)
+        return block
+
+    def words(self, text, top):
+        return [self.block("WORD", top, Text=word)["Id"] for word in text.split()]
+
+    def page(self):
+        self.pages.append([])
+
+    def field(self, key, value, top, left=0.15, width=0.6):
+        if value in ("SELECTED", "NOT_SELECTED"):
+            children = [self.block("SELECTION_ELEMENT", top, SelectionStatus=value)["Id"]]
+        else:
+            children = self.words(value, top)
+        value_block = self.block("KEY_VALUE_SET", top, EntityTypes=["VALUE"], Relationships=[{"Type": "CHILD", "Ids": children}])
+        key_block = self.block(
+            "KEY_VALUE_SET", top, left=left, width=width, EntityTypes=["KEY"],
+            Relationships=[{"Type": "CHILD", "Ids": self.words(key, top)}, {"Type": "VALUE", "Ids": [value_block["Id"]]}]
+        )
+        self.pages[-1].append(key_block)
+
+    def table(self, top, rows, row_height=0.05):
+        cells = []
+        for index, text in enumerate(rows):
+            cell = self.block(
+                "CELL", top + index * row_height, height=row_height, RowIndex=index + 1, ColumnIndex=1, RowSpan=1, ColumnSpan=1,
+                Relationships=[{"Type": "CHILD", "Ids": self.words(text, top + index * row_height)}] if text else []
+            )
+            cells.append(cell["Id"])
+        table = self.block("TABLE", top, height=len(rows) * row_height, Relationships=[{"Type": "CHILD", "Ids": cells}])
+        self.pages[-1].append(table)
+
+    def document(self):
+        blocks = []
+        for number, content in enumerate(self.pages, start=1):
+            content = sorted(content, key=lambda block: block["Geometry"]["BoundingBox"]["Top"])
+            blocks.append({"BlockType": "PAGE", "Id": f"page{number}", "Confidence": 99.0, "Geometry": geometry(0, 1, 0, 1)})
+            blocks.extend(content)
+        content_ids = {block["Id"] for block in blocks}
+        blocks.extend(block for block in self.blocks if block["Id"] not in content_ids)
+        return trp.Document({"Blocks": blocks})
+
+
+def records(doc):
+    return [(record["title"], record["timescale"], record["context"]) for record in extract_nc.iter_issue_records(doc.document())]
+
+
+def test_title_inside_its_own_table_keeps_that_table():
+    doc = SyntheticDocument()
+    doc.page()
+    doc.table(0.10, ["Issue 1 header", "", "Explanation-for-issue-1"])
+    doc.field("Issue Title", "Issue1", 0.16)
+    doc.table(0.40, ["Issue 2 header", "", "Explanation-for-issue-2"])
+    doc.field("Issue Title", "Issue2", 0.46)
+
+    assert records(doc) == [
+        ("Issue1", "Other", ["Issue 1 header", "Explanation-for-issue-1"]),
+        ("Issue2", "Other", ["Issue 2 header", "Explanation-for-issue-2"]),
+    ]
+
+
+def test_table_below_a_title_belongs_to_it_across_pages():
+    doc = SyntheticDocument()
+    doc.page()
+    doc.table(0.02, ["Audit summary"])
+    doc.field("Issue Title", "Issue1", 0.20)
+    doc.field("30 days", "SELECTED", 0.25, left=0.1, width=0.1)
+    doc.table(0.30, ["Explanation-for-issue-1"])
+    doc.field("Issue Title", "Issue2", 0.60)
+    doc.field("60 days", "SELECTED", 0.65, left=0.1, width=0.1)
+    doc.page()
+    doc.table(0.05, ["Explanation-for-issue-2 continued"])
+    doc.field("Issue Title", "", 0.50)
+
+    assert records(doc) == [
+        ("Issue1", "30 days", ["Audit summary", "Explanation-for-issue-1"]),
+        ("Issue2", "60 days", ["Explanation-for-issue-2 continued"]),
+    ]
+
+
+def test_two_titles_in_one_table_split_its_rows():
+    doc = SyntheticDocument()
+    doc.page()
+    doc.table(0.10, ["Issue1 title row", "Explanation-for-issue-1", "Issue2 title row", "Explanation-for-issue-2"])
+    doc.field("Issue Title", "Issue1", 0.10)
+    doc.field("Issue Title", "Issue2", 0.20)
+
+    assert records(doc) == [
+        ("Issue1", "Other", ["Issue1 title row", "Explanation-for-issue-1"]),
+        ("Issue2", "Other", ["Issue2 title row", "Explanation-for-issue-2"]),
+    ]
+
+
+def issue_record(title, context_chars=0):
+    return {"title": title, "timescale": "30 days", "context": ["x" * context_chars] if context_chars else []}
+
+
+def test_batches_respect_token_and_issue_limits():
+    records = [issue_record(f"Issue{i}", context_chars=400) for i in range(7)]
+    tokens = extract_nc.estimate_tokens(extract_nc.format_issue_records(records[:1]))
+
+    by_tokens = extract_nc.batch_issue_records(records, max_tokens=tokens * 3, max_issues=10)
+    by_count = extract_nc.batch_issue_records(records, max_tokens=10_000, max_issues=2)
+
+    assert [len(batch) for batch in by_tokens] == [3, 3, 1]
+    assert [len(batch) for batch in by_count] == [2, 2, 2, 1]
+    assert [record for batch in by_tokens for record in batch] == records
+
+
+def test_oversized_issue_gets_a_batch_of_its_own():
+    records = [issue_record("Small"), issue_record("Huge", context_chars=40_000), issue_record("Small again")]
+
+    batches = extract_nc.batch_issue_records(records, max_tokens=1000, max_issues=10)
+
+    assert [[record["title"] for record in batch] for batch in batches] == [["Small"], ["Huge"], ["Small again"]]
+
+
+def test_explanations_keep_issue_order_across_batches(monkeypatch):
+    def explain_issues(batch):
+        # later batches finish first
+        time.sleep(0.02 / (int(batch[0]["title"][5:]) + 1))
+        return [("non-compliance", record["title"], record["timescale"], "explanation") for record in batch]
+
+    monkeypatch.setattr(extract_nc, "explain_issues", explain_issues)
+    monkeypatch.setattr(extract_nc, "explanation_batch_tokens", 10_000)
+    monkeypatch.setattr(extract_nc, "explanation_batch_issues", 2)
+    monkeypatch.setattr(extract_nc, "explanation_max_workers", 4)
+    records = [issue_record(f"Issue{i}") for i in range(9)]
+
+    issues = extract_nc.get_explanation(records)
+
+    assert [issue[1] for issue in issues] == [f"Issue{i}" for i in range(9)]
+
+
+class TruncatingModel:
+    """Answers every issue in the prompt, but runs out of tokens on more than max_issues"""
+    def __init__(self, max_issues):
+        self.max_issues = max_issues
+        self.calls = []
+
+    def invoke_model(self, bedrock_runtime, body, modelId, **kwargs):
+        prompt = json.loads(body)["messages"][0]["content"][0]["text"]
+        titles = re.findall(r"Issue Title: (\S+)", prompt)
+        self.calls.append(titles)
+        entries = [["non-compliance", title, "30 days", f"explanation of {title}"] for title in titles]
+        text = "<response>\n" + json.dumps(entries)
+        if len(titles) > self.max_issues:
+            # cut off part way through the last entry
+            return {"content": [{"text": text[:-30]}], "stop_reason": "max_tokens"}
+        return {"content": [{"text": text + "\n</response>"}], "stop_reason": "end_turn"}
+
+
+def test_truncated_batch_is_split_and_rerun(monkeypatch):
+    model = TruncatingModel(max_issues=2)
+    monkeypatch.setattr(extract_nc, "llm_cache", model)
+    records = [issue_record(f"Issue{i}") for i in range(5)]
+
+    issues = extract_nc.explain_issues(records)
+
+    assert [issue[1] for issue in issues] == [f"Issue{i}" for i in range(5)]
+    assert [issue[3] for issue in issues] == [f"explanation of Issue{i}" for i in range(5)]
+    assert model.calls == [
+        ["Issue0", "Issue1", "Issue2", "Issue3", "Issue4"],
+        ["Issue0", "Issue1"],
+        ["Issue2", "Issue3", "Issue4"],
+        ["Issue2"],
+        ["Issue3", "Issue4"],
+    ]
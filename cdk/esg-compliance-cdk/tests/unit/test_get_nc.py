@@ -0,0 +1,67 @@
+import importlib.util
+import os
+import sys
+
+import pytest
+
+pytest.importorskip("boto3")
+
+CDK_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+LAMBDA_ROOT = os.path.join(CDK_ROOT, "lambdas", "get_nc")
+MODULE_PATH = os.path.join(LAMBDA_ROOT, "lambda_function.py")
+# the handler imports its modules the way the lambda runtime does
+sys.path.insert(0, LAMBDA_ROOT)
+os.environ.setdefault("AWS_DEFAULT_REGION", "eu-west-2")
+os.environ.setdefault("SUPPLIER_TABLE", "supplier-table")
+
+spec = importlib.util.spec_from_file_location("get_nc", MODULE_PATH)
+get_nc = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(get_nc)
+
+
+class FakeTable:
+    def __init__(self, pages):
+        self.pages = pages
+        self.queries = []
+
+    def query(self, **kwargs):
+        self.queries.append(kwargs)
+        return self.pages[len(self.queries) - 1]
+
+
+class FakeResource:
+    def __init__(self, table):
+        self.table = table
+
+    def Table(self, name):
+        return self.table
+
+
+def issue(number):
+    return {"Company Name": "Acme", "AuditDateIssueNumber": f"2024-03-01-section3#{number}", "Issue Title": f"issue {number}"}
+
+
+def test_query_reads_every_page_of_the_section(monkeypatch):
+    table = FakeTable([
+        {"Items": [issue(10), issue(2)], "LastEvaluatedKey": {"page": 1}, "ConsumedCapacity": {"CapacityUnits": 0.5}},
+        {"Items": [issue(1)], "ConsumedCapacity": {"CapacityUnits": 0.5}},
+    ])
+    monkeypatch.setattr(get_nc, "ddb", FakeResource(table))
+
+    items, read_units = get_nc.get_issues_for_section("supplier-table", "Acme", "2024-03-01", "section3")
+
+    assert [item["Issue Title"] for item in items] == ["issue 1", "issue 2", "issue 10"]
+    assert read_units == 1.0
+    first, second = table.queries
+    condition = first["KeyConditionExpression"].get_expression()["values"][1].get_expression()
+    assert condition["operator"] == "begins_with"
+    assert condition["values"][1] == "2024-03-01-section3#"
+    assert "ExclusiveStartKey" not in first
+    assert second["ExclusiveStartKey"] == {"page": 1}
+    # every page is projected, not just the later ones
+    for query in table.queries:
+        # get_nc runs straight after the section's items are written
+        assert query["ConsistentRead"] is True
+        assert set(query["ExpressionAttributeNames"].values()) == set(get_nc.PROJECTED_ATTRIBUTES)
+        assert query["ProjectionExpression"].split(", ") == list(query["ExpressionAttributeNames"])
+        assert "Report Explanation" not in query["ExpressionAttributeNames"].values()
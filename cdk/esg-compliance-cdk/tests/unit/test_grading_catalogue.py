@@ -0,0 +1,134 @@
+import importlib.util
+import io
+import json
+import os
+
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("rapidfuzz")
+exceptions = pytest.importorskip("botocore.exceptions")
+
+CDK_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+MODULE_PATH = os.path.join(CDK_ROOT, "lambdas", "extract_nc", "modules", "grading_catalogue.py")
+
+spec = importlib.util.spec_from_file_location("grading_catalogue", MODULE_PATH)
+grading_catalogue = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(grading_catalogue)
+GradingCatalogue = grading_catalogue.GradingCatalogue
+
+
+class Body(io.BytesIO):
+    def iter_lines(self):
+        return iter(self.getvalue().splitlines())
+
+
+class FakeS3:
+    def __init__(self, gradings=None):
+        self.snapshot = None
+        self.version = 0
+        self.gets = 0
+        if gradings is not None:
+            self.write(gradings)
+
+    def write(self, gradings):
+        self.snapshot = "".join(json.dumps(grading) + "\n" for grading in gradings).encode("utf-8")
+        self.version += 1
+
+    def head_object(self, Bucket, Key):
+        if self.snapshot is None:
+            raise exceptions.ClientError({"Error": {"Code": "404"}}, "HeadObject")
+        return {"ETag": f'"v{self.version}"'}
+
+    def get_object(self, Bucket, Key):
+        self.gets += 1
+        return {"Body": Body(self.snapshot)}
+
+
+class FakeDynamoDB:
+    def __init__(self, pages):
+        self.pages = pages
+        self.scans = 0
+
+    def get_paginator(self, operation):
+        assert operation == "scan"
+        return self
+
+    def paginate(self, TableName):
+        self.scans += 1
+        return iter(self.pages)
+
+
+def grading(title, rating="Major"):
+    return {"Issue Title": title, "Updated Grading": rating}
+
+
+def test_snapshot_is_reloaded_only_when_its_etag_changes():
+    s3 = FakeS3([grading("Fire exits blocked")])
+    catalogue = GradingCatalogue(ddb_client=FakeDynamoDB([]), s3_client=s3, table_name="gradings", bucket="gradings-bucket")
+
+    catalogue.best_matches(["Fire exits blocked"])
+    catalogue.best_matches(["Fire exits blocked"])
+    assert s3.gets == 1
+
+    s3.write([grading("Fire exits blocked", rating="Minor")])
+    match, = catalogue.best_matches(["Fire exits blocked"])
+    assert s3.gets == 2
+    assert match["Updated Grading"] == {"S": "Minor"}
+
+
+def test_table_is_scanned_while_there_is_no_snapshot():
+    ddb = FakeDynamoDB([
+        {"Items": [{"Issue Title": {"S": "Fire exits blocked"}, "Updated Grading": {"S": "Major"}}]},
+        {"Items": [{"Issue Title": {"S": "No wage slips"}, "Updated Grading": {"S": "Minor"}}]},
+    ])
+    catalogue = GradingCatalogue(ddb_client=ddb, s3_client=FakeS3(), table_name="gradings", bucket="gradings-bucket")
+
+    matches = catalogue.best_matches(["No wage slips", "Fire exits blocked"])
+
+    assert [match["Updated Grading"]["S"] for match in matches] == ["Minor", "Major"]
+    assert ddb.scans == 1
+
+
+def test_matches_must_score_above_the_threshold():
+    catalogue = GradingCatalogue(
+        ddb_client=FakeDynamoDB([]),
+        s3_client=FakeS3([grading("Fire exits blocked by stock"), grading("Wages paid late")]),
+        table_name="gradings",
+        bucket="gradings-bucket",
+    )
+
+    exact, partial, unrelated = catalogue.best_matches(["  FIRE EXITS BLOCKED by stock ", "fire exits blocked", "Child labour found"])
+
+    assert exact["Issue Title"] == {"S": "Fire exits blocked by stock"}
+    # partial_ratio scores a title contained in a catalogue title as 100
+    assert partial["Issue Title"] == {"S": "Fire exits blocked by stock"}
+    assert unrelated is None
+
+
+def test_score_of_exactly_the_threshold_is_not_a_match(monkeypatch):
+    catalogue = GradingCatalogue(
+        ddb_client=FakeDynamoDB([]), s3_client=FakeS3([grading("Fire exits blocked")]), table_name="gradings", bucket="gradings-bucket"
+    )
+    monkeypatch.setattr(grading_catalogue.fuzz, "partial_ratio", lambda *args, **kwargs: grading_catalogue.MATCH_THRESHOLD)
+
+    assert grading_catalogue.MATCH_THRESHOLD == 80
+    assert catalogue.best_matches(["Fire exits blocked"]) == [None]
+
+
+def test_short_catalogue_title_inside_a_long_issue_is_not_a_match():
+    catalogue = GradingCatalogue(
+        ddb_client=FakeDynamoDB([]),
+        s3_client=FakeS3([grading("t"), grading("No fire alarms"), grading("fire risk assessment")]),
+        table_name="gradings",
+        bucket="gradings-bucket",
+    )
+
+    matches = catalogue.best_matches([
+        "wages paid late to migrant workers",
+        "forced overtime on sundays",
+        "No fire alarms in the warehouse or the dormitory",
+        "no fire risk assessment has been carried out for the dormitory",
+    ])
+
+    assert matches == [None, None, None, None]
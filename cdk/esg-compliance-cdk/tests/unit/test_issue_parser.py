@@ -0,0 +1,90 @@
+import importlib.util
+import json
+import os
+import random
+import string
+
+import pytest
+
+CDK_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+MODULE_PATH = os.path.join(CDK_ROOT, "lambdas", "extract_nc", "modules", "issue_parser.py")
+CORPUS_PATH = os.path.join(os.path.dirname(__file__), "fixtures", "malformed_issue_responses.json")
+
+spec = importlib.util.spec_from_file_location("issue_parser", MODULE_PATH)
+issue_parser = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(issue_parser)
+
+with open(CORPUS_PATH) as f:
+    CORPUS = json.load(f)
+
+
+def random_issue(rng):
+    words = ["".join(rng.choices(string.ascii_lowercase, k=rng.randint(2, 9))) for _ in range(rng.randint(5, 40))]
+    for _ in range(rng.randint(0, 3)):
+        words.insert(rng.randrange(len(words)), rng.choice(['"quoted"', "worker's", "[table]", "a,b", "it's", "(n/a)"]))
+    return (
+        rng.choice(["non-compliance", "observation", "good-example"]),
+        " ".join(words[:4]),
+        rng.choice(["30 days", "60 days", "90 days", "Immediate", "N/A"]),
+        " ".join(words),
+    )
+
+
+def render(issues, style):
+    if style == "json":
+        return json.dumps([list(issue) for issue in issues], indent=4)
+    if style == "unescaped":
+        return "[\n" + ",\n".join("    [" + ", ".join(f'"{field}"' for field in issue) + "]" for issue in issues) + ",\n]"
+    return "[\n" + ",\n".join("    [" + ", ".join(repr(field) for field in issue) + "]" for issue in issues) + "\n]"
+
+
+@pytest.mark.parametrize("case", CORPUS, ids=[case["name"] for case in CORPUS])
+def test_corpus(case):
+    assert [list(issue) for issue in issue_parser.parse_issues(case["response"])] == case["expected"]
+
+
+@pytest.mark.parametrize("style", ["json", "unescaped", "repr"])
+def test_fuzz_round_trip(style):
+    rng = random.Random(style)
+    for _ in range(200):
+        issues = [random_issue(rng) for _ in range(rng.randint(1, 8))]
+        text = f"Sure.\n<response>\n{render(issues, style)}\n</response>"
+        assert issue_parser.parse_issues(text) == issues
+
+
+def test_fuzz_never_raises():
+    rng = random.Random(0)
+    for case in CORPUS:
+        text = case["response"]
+        for _ in range(200):
+            cut = rng.randrange(len(text) + 1)
+            mutated = text[:cut] + rng.choice(["", "[", "]", '"', "'", ",", "\\", "\n"]) + text[cut + rng.randint(0, 5):]
+            for issue in issue_parser.parse_issues(mutated):
+                assert len(issue) == 4
+
+
+@pytest.mark.parametrize("style", ["json", "unescaped"])
+def test_large_response(style):
+    rng = random.Random(1)
+    issues = [random_issue(rng) for _ in range(500)]
+    text = f"<response>\n{render(issues, style)}\n</response>"
+
+    assert issue_parser.parse_issues(text) == issues
+
+
+def test_fallback_lookahead_is_bounded_by_quotes(monkeypatch):
+    rng = random.Random(2)
+    issues = [random_issue(rng) for _ in range(200)]
+    body = render(issues, "unescaped")
+    peeks = []
+    next_char = issue_parser.next_char
+
+    def counting_next_char(text, start):
+        peeks.append(start)
+        return next_char(text, start)
+
+    monkeypatch.setattr(issue_parser, "next_char", counting_next_char)
+
+    assert list(issue_parser.scan_entries(body)) == [list(issue) for issue in issues]
+    # lookahead happens only at quotes, so the scan stays linear in the response length
+    assert len(peeks) <= 4 * body.count('"') + 2 * body.count("'")
@@ -0,0 +1,95 @@
+import importlib.util
+import io
+import json
+import os
+
+import pytest
+
+pytest.importorskip("botocore")
+
+CDK_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+MODULE_PATH = os.path.join(CDK_ROOT, "lambdas", "extract_nc", "modules", "llm_cache.py")
+
+spec = importlib.util.spec_from_file_location("llm_cache", MODULE_PATH)
+llm_cache = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(llm_cache)
+LLMResponseCache = llm_cache.LLMResponseCache
+
+
+class FakeBedrock:
+    def __init__(self, stop_reason="end_turn"):
+        self.calls = 0
+        self.stop_reason = stop_reason
+
+    def invoke_model(self, body, modelId, **kwargs):
+        self.calls += 1
+        payload = {"content": [{"text": f"response {self.calls}"}], "stop_reason": self.stop_reason}
+        return {"body": io.BytesIO(json.dumps(payload).encode("utf-8"))}
+
+
+class DictStore:
+    def __init__(self):
+        self.entries = {}
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def put(self, key, value):
+        self.entries[key] = value
+
+
+def body(text, temperature=0.5):
+    return json.dumps({"system": "extract", "messages": [{"role": "user", "content": text}], "temperature": temperature})
+
+
+def test_repeated_request_is_served_from_cache():
+    bedrock = FakeBedrock()
+    cache = LLMResponseCache()
+
+    first = cache.invoke_model(bedrock, body=body("table"), modelId="haiku")
+    second = cache.invoke_model(bedrock, body=body("table"), modelId="haiku")
+
+    assert first == second
+    assert bedrock.calls == 1
+
+
+def test_model_and_params_are_part_of_the_key():
+    bedrock = FakeBedrock()
+    cache = LLMResponseCache()
+
+    cache.invoke_model(bedrock, body=body("table"), modelId="haiku")
+    cache.invoke_model(bedrock, body=body("table"), modelId="sonnet")
+    cache.invoke_model(bedrock, body=body("table", temperature=0.1), modelId="haiku")
+
+    assert bedrock.calls == 3
+
+
+def test_persistent_store_survives_a_cold_start():
+    bedrock = FakeBedrock()
+    store = DictStore()
+
+    LLMResponseCache(store=store).invoke_model(bedrock, body=body("table"), modelId="haiku")
+    LLMResponseCache(store=store).invoke_model(bedrock, body=body("table"), modelId="haiku")
+
+    assert bedrock.calls == 1
+
+
+def test_lru_evicts_oldest_entry():
+    bedrock = FakeBedrock()
+    cache = LLMResponseCache(maxsize=1)
+
+    cache.invoke_model(bedrock, body=body("a"), modelId="haiku")
+    cache.invoke_model(bedrock, body=body("b"), modelId="haiku")
+    cache.invoke_model(bedrock, body=body("a"), modelId="haiku")
+
+    assert bedrock.calls == 3
+
+
+def test_truncated_responses_are_not_cached():
+    bedrock = FakeBedrock(stop_reason="max_tokens")
+    cache = LLMResponseCache()
+
+    cache.invoke_model(bedrock, body=body("table"), modelId="haiku")
+    cache.invoke_model(bedrock, body=body("table"), modelId="haiku")
+
+    assert bedrock.calls == 2
@@ -0,0 +1,73 @@
+import ast
+import importlib.util
+import json
+import os
+from decimal import Decimal
+
+CDK_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+MODULE_PATH = os.path.join(CDK_ROOT, "lambdas", "get_nc", "modules", "nc_records.py")
+
+spec = importlib.util.spec_from_file_location("nc_records", MODULE_PATH)
+nc_records = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(nc_records)
+
+
+def loads_records(text):
+    # how the upload page reads the file, one JSON object per line
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def supplier_item(number, **overrides):
+    item = {
+        "Company Name": "Acme Textiles",
+        "AuditDateIssueNumber": f"2024-03-01-section3#{number}",
+        "Date Of Audit": "2024-03-01",
+        "Clause": "3 - Working conditions are safe and hygienic",
+        "Issue Type": "non-compliance",
+        "Issue Title": f"Fire exit {number} blocked, \"urgent\"",
+        "Report Timescale": "30 days",
+        "Report Explanation": "The fire exit was blocked by stock.",
+        "ESG Rating": "Major",
+        "ESG Timescale": "30 days",
+        "Exact Issue Title": "Yes",
+        "Timescales Match": "Yes",
+    }
+    item.update(overrides)
+    return item
+
+
+def test_records_follow_the_fixed_schema():
+    items = [
+        supplier_item(1),
+        supplier_item(2, **{"Timescales Match": "N/A", "Exact Issue Title": "No", "ESG Rating": Decimal("2")}),
+        {"Company Name": "Acme Textiles", "AuditDateIssueNumber": "2024-03-01-section3#3", "Issue Type": "observation"},
+    ]
+
+    records = loads_records(nc_records.dumps_records(items))
+
+    assert [list(record) for record in records] == [nc_records.NC_COLUMNS] * 3
+    assert [record["Issue Number"] for record in records] == [1, 2, 3]
+    assert records[0]["Issue Title"] == 'Fire exit 1 blocked, "urgent"'
+    assert (records[0]["Timescales Match"], records[0]["Exact Issue Title"]) == (True, True)
+    assert (records[1]["Timescales Match"], records[1]["Exact Issue Title"]) == (None, False)
+    assert records[1]["ESG Rating"] == "2"
+    assert records[2]["ESG Rating"] is None
+    assert "Report Explanation" not in records[0]
+
+
+def test_no_issues_is_an_empty_file():
+    assert nc_records.dumps_records([]) == ""
+    assert loads_records("") == []
+
+
+def test_large_section_keeps_every_issue_and_field():
+    items = [supplier_item(number) for number in range(2000)]
+    # what the upload page used to get back from the str() output
+    legacy = ast.literal_eval(str(items))
+
+    records = loads_records(nc_records.dumps_records(items))
+
+    assert len(records) == len(legacy)
+    for record, item in zip(records, legacy):
+        assert record["Issue Number"] == int(item["AuditDateIssueNumber"].rsplit("#", 1)[1])
+        assert all(record[column] == item[column] for column in nc_records.TEXT_COLUMNS)
@@ -0,0 +1,49 @@
+import importlib.util
+import os
+import sys
+
+import pytest
+
+pytest.importorskip("boto3")
+
+CDK_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+LAMBDA_ROOT = os.path.join(CDK_ROOT, "lambdas", "bedrock_supplier_extraction")
+MODULE_PATH = os.path.join(LAMBDA_ROOT, "modules", "partition_keys.py")
+# partition_keys imports its sibling modules the way the lambda runtime does
+sys.path.insert(0, LAMBDA_ROOT)
+
+spec = importlib.util.spec_from_file_location("partition_keys", MODULE_PATH)
+partition_keys = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(partition_keys)
+
+
+@pytest.mark.parametrize("date_string", [
+    "06/03/2024",
+    "6/3/24",
+    "06-03-2024",
+    "6.3.2024",
+    "6th March 2024",
+    "6th March, 2024",
+    "March 6, 2024",
+    "06-Mar-24",
+    "06-07/03/2024",
+    "06 - 07 March 2024",
+    "6th & 7th March 2024",
+    "06/03/2024 - 07/03/2024",
+    "6 March to 7 March 2024",
+    "2024-03-06",
+])
+def test_parse_audit_date(date_string):
+    assert partition_keys.parse_audit_date(date_string) == "2024-03-06"
+
+
+def test_parse_audit_date_unrecognised():
+    assert partition_keys.parse_audit_date("date of audit") is None
+
+
+def test_format_audit_date_skips_llm_when_parsed(monkeypatch):
+    def fail(date_string):
+        raise AssertionError("LLM should not be called")
+
+    monkeypatch.setattr(partition_keys, "llm_format_audit_date", fail)
+    assert partition_keys.format_audit_date("1st Sept 2023") == "2023-09-01"
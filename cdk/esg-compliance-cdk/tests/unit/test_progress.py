@@ -0,0 +1,92 @@
+import importlib.util
+import os
+
+import pytest
+
+pytest.importorskip("botocore")
+
+CDK_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+MODULE_PATH = os.path.join(CDK_ROOT, "lambdas", "report_split", "modules", "progress.py")
+
+spec = importlib.util.spec_from_file_location("progress", MODULE_PATH)
+progress = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(progress)
+ProgressRecorder = progress.ProgressRecorder
+
+
+class FakeDynamoDB:
+    def __init__(self):
+        self.items = {}
+        self.versions = {}
+
+    def put_item(self, TableName, Item):
+        self.items[(Item["Import Uid"]["S"], Item["Record"]["S"])] = Item
+
+    def update_item(self, TableName, Key, **kwargs):
+        uid = Key["Import Uid"]["S"]
+        self.versions[uid] = self.versions.get(uid, 0) + 1
+
+
+def test_stage_run_records_timings_and_counts():
+    ddb = FakeDynamoDB()
+    recorder = ProgressRecorder(ddb, "status")
+
+    run = recorder.start("uid-1", "nc", section="section3")
+    assert ddb.items[("uid-1", "stage#nc#section3")]["Status"] == {"S": "running"}
+
+    recorder.finish(run, counts={"issues": 4})
+    item = ddb.items[("uid-1", "stage#nc#section3")]
+    assert item["Status"] == {"S": "completed"}
+    assert item["Section"] == {"S": "section3"}
+    assert item["Counts"] == {"M": {"issues": {"N": "4"}}}
+    assert int(item["Duration Ms"]["N"]) >= 0
+    assert item["Started At"]["S"] <= item["Ended At"]["S"]
+    assert ddb.versions["uid-1"] == 2
+
+
+def test_handler_that_raises_records_its_open_stages_as_failed():
+    ddb = FakeDynamoDB()
+    recorder = ProgressRecorder(ddb, "status")
+
+    @recorder.reports_failures
+    def handler(event, context):
+        recorder.finish(recorder.start("uid-1", "split"))
+        recorder.start("uid-1", "nc", section="section3")
+        raise ValueError("no issues table")
+
+    with pytest.raises(ValueError):
+        handler({}, None)
+
+    assert ddb.items[("uid-1", "stage#split")]["Status"] == {"S": "completed"}
+    item = ddb.items[("uid-1", "stage#nc#section3")]
+    assert item["Status"] == {"S": "failed"}
+    assert item["Error"] == {"S": "ValueError: no issues table"}
+    assert int(item["Duration Ms"]["N"]) >= 0
+    assert item["Started At"]["S"] <= item["Ended At"]["S"]
+    assert recorder.open_runs == []
+
+
+def test_handler_that_returns_leaves_its_stages_alone():
+    ddb = FakeDynamoDB()
+    recorder = ProgressRecorder(ddb, "status")
+
+    @recorder.reports_failures
+    def handler(event, context):
+        recorder.finish(recorder.start("uid-1", "split"))
+        return {"statusCode": 200}
+
+    assert handler({}, None) == {"statusCode": 200}
+    assert ddb.items[("uid-1", "stage#split")]["Status"] == {"S": "completed"}
+    assert ddb.versions["uid-1"] == 2
+
+
+def test_no_table_is_a_no_op():
+    ddb = FakeDynamoDB()
+    recorder = ProgressRecorder(ddb, None)
+
+    recorder.finish(recorder.start("uid-1", "split"))
+    assert ddb.items == {}
+
+
+def test_import_uid_from_uri():
+    assert progress.import_uid_from_uri("s3://bucket/uid-1/processing/section3_nc.pdf") == "uid-1"
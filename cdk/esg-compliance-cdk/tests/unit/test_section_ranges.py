@@ -0,0 +1,63 @@
+import importlib.util
+import os
+
+CDK_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+MODULE_PATH = os.path.join(CDK_ROOT, "lambdas", "report_split", "modules", "section_ranges.py")
+
+spec = importlib.util.spec_from_file_location("section_ranges", MODULE_PATH)
+section_ranges = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(section_ranges)
+
+
+def test_natural_sort_orders_section_keys_as_in_the_report():
+    keys = ["section10a", "section2", "section0b", "section10b", "section0a", "section1", "section8a", "section8"]
+
+    assert sorted(keys, key=section_ranges.natural_sort_key) == [
+        "section0a", "section0b", "section1", "section2", "section8", "section8a", "section10a", "section10b"
+    ]
+
+
+def test_contents_page_is_dropped_unless_it_is_the_only_hit():
+    hits = {"section1": [1, 5], "section2": [1, 8], "section3": [1]}
+
+    assert section_ranges.drop_shared_pages(hits) == {"section1": [5], "section2": [8], "section3": [1]}
+
+
+def test_starts_skip_stray_mentions_before_the_previous_section():
+    starts = section_ranges.resolve_section_starts([
+        ("section1", [5, 20]),
+        ("section2", [3, 9]),
+        ("section3", [7, 12]),
+    ])
+
+    assert starts == {"section1": 5, "section2": 9, "section3": 12}
+
+
+def test_ranges_ignore_contents_page_and_stray_hits():
+    hits = {"section3": [1, 12], "section1": [1, 5, 20], "section2": [1, 8, 25]}
+
+    assert section_ranges.resolve_section_ranges(hits, page_count=30) == {
+        "section1": (5, 8),
+        "section2": (8, 12),
+        "section3": (12, 30),
+    }
+
+
+def test_section_out_of_report_order_is_left_unresolved():
+    # section3's only heading comes before section2's
+    hits = {"section1": [2], "section2": [10], "section3": [4], "section4": [15]}
+
+    assert section_ranges.resolve_section_ranges(hits, page_count=20) == {
+        "section1": (2, 10),
+        "section2": (10, 15),
+        "section4": (15, 20),
+    }
+
+
+def test_section_never_found_is_left_out():
+    hits = {"section1": [2], "section2": [], "section10a": [9]}
+
+    assert section_ranges.resolve_section_ranges(hits, page_count=12) == {
+        "section1": (2, 9),
+        "section10a": (9, 12),
+    }
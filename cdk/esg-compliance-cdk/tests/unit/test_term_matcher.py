@@ -0,0 +1,115 @@
+import importlib.util
+import os
+import random
+import string
+
+import yaml
+
+CDK_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+MODULE_PATH = os.path.join(CDK_ROOT, "lambdas", "report_split", "modules", "term_matcher.py")
+CONFIG_DIR = os.path.join(CDK_ROOT, "lambdas", "report_split", "config")
+
+spec = importlib.util.spec_from_file_location("term_matcher", MODULE_PATH)
+term_matcher = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(term_matcher)
+TermMatcher = term_matcher.TermMatcher
+
+CLAUSES = [
+    "universal rights covering ungp",
+    "management systems and code implementation",
+    "freely chosen employment",
+    "freedom of association and right to collective bargaining are respected",
+    "working conditions are safe and hygienic",
+    "child labour shall not be used",
+    "living wages are paid",
+    "working hours are not excessive",
+    "no discrimination is practiced",
+    "regular employment is provided",
+    "no harsh or inhumane treatment is allowed",
+    "entitlement to work and immigration",
+    "environment 2-pillar",
+    "environment 4-pillar",
+    "business ethics 4-pillar",
+]
+END_TERM = "current systems and evidence examined"
+
+
+def build_configs():
+    with open(os.path.join(CONFIG_DIR, "supplier_pages.yaml")) as f:
+        supplier_config = yaml.safe_load(f)
+    section_config = {
+        f"section{i}": {"search_terms": [clause, END_TERM]}
+        for i, clause in enumerate(CLAUSES)
+    }
+    return supplier_config, section_config
+
+
+def build_report(configs, page_count=300, seed=0):
+    rng = random.Random(seed)
+    vocabulary = ["".join(rng.choices(string.ascii_lowercase, k=rng.randint(2, 9))) for _ in range(2000)]
+    terms = [term for config in configs for obj in config.values() for term in obj["search_terms"]]
+    pages = []
+    for _ in range(page_count):
+        words = rng.choices(vocabulary, k=500)
+        for _ in range(rng.randint(0, 4)):
+            words.insert(rng.randrange(len(words)), rng.choice(terms))
+        pages.append(" ".join(words))
+    return pages
+
+
+def naive_identified_pages(page_texts, config):
+    return {
+        name: [
+            number for number, text in enumerate(page_texts)
+            if all(term.lower() in text for term in obj["search_terms"])
+        ]
+        for name, obj in config.items()
+    }
+
+
+def indexed_identified_pages(page_texts, postings, config):
+    return {
+        name: TermMatcher.match_all(postings, [term.lower() for term in obj["search_terms"]], len(page_texts))
+        for name, obj in config.items()
+    }
+
+
+def test_index_matches_substring_search():
+    configs = build_configs()
+    page_texts = build_report(configs)
+    matcher = TermMatcher(term.lower() for config in configs for obj in config.values() for term in obj["search_terms"])
+    postings = matcher.index(page_texts)
+
+    for config in configs:
+        assert indexed_identified_pages(page_texts, postings, config) == naive_identified_pages(page_texts, config)
+
+
+def test_match_any_and_empty_terms():
+    postings = TermMatcher(["gps", "lead auditor"]).index(["gps here", "nothing", "lead auditor gps"])
+    assert TermMatcher.match_any(postings, ["gps", "lead auditor"]) == [0, 2]
+    assert TermMatcher.match_any(postings, None) == []
+    assert TermMatcher.match_all(postings, [], 3) == [0, 1, 2]
+
+
+class CountingText(str):
+    """Page text that counts the substring checks made against it"""
+    checks = 0
+
+    def __contains__(self, term):
+        CountingText.checks += 1
+        return super().__contains__(term)
+
+
+def test_index_checks_each_unique_term_once_per_page():
+    configs = build_configs()
+    page_texts = [CountingText(text) for text in build_report(configs)]
+    terms = [term.lower() for config in configs for obj in config.values() for term in obj["search_terms"]]
+
+    CountingText.checks = 0
+    TermMatcher(terms).index(page_texts)
+    assert CountingText.checks == len(page_texts) * len(set(terms))
+
+    # entries sharing terms, e.g. every section's end term, add no further checks
+    CountingText.checks = 0
+    TermMatcher(terms * 3).index(page_texts)
+    assert CountingText.checks == len(page_texts) * len(set(terms))
@@ -0,0 +1,108 @@
+import gzip
+import importlib.util
+import io
+import json
+import os
+import sys
+
+import pytest
+
+exceptions = pytest.importorskip("botocore.exceptions")
+pymupdf = pytest.importorskip("pymupdf")
+
+CDK_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+MODULE_PATH = os.path.join(CDK_ROOT, "lambdas", "extract_nc", "modules", "textract_cache.py")
+REPORT_SPLIT_ROOT = os.path.join(CDK_ROOT, "lambdas", "report_split")
+# report_split imports its sibling modules the way the lambda runtime does
+sys.path.insert(0, REPORT_SPLIT_ROOT)
+os.environ.setdefault("AWS_DEFAULT_REGION", "eu-west-2")
+
+spec = importlib.util.spec_from_file_location("textract_cache", MODULE_PATH)
+textract_cache = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(textract_cache)
+TextractCache = textract_cache.TextractCache
+
+spec = importlib.util.spec_from_file_location("report_split", os.path.join(REPORT_SPLIT_ROOT, "modules", "report_split.py"))
+report_split = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(report_split)
+
+
+def make_report(pages=6):
+    with pymupdf.open() as doc:
+        for number in range(pages):
+            doc.new_page().insert_text((72, 72), f"Section {number} findings")
+        return doc.tobytes()
+
+
+class FakeS3:
+    def __init__(self, objects):
+        self.objects = dict(objects)
+
+    def get_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objects:
+            raise exceptions.ClientError({"Error": {"Code": "NoSuchKey"}}, "GetObject")
+        return {"Body": io.BytesIO(self.objects[(Bucket, Key)])}
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.objects[(Bucket, Key)] = Body
+
+
+def split_section(report, ranges):
+    with pymupdf.open(stream=report, filetype="pdf") as doc:
+        return report_split.build_section_pdf(doc, "section3", ranges)
+
+
+def test_resplit_report_hits_the_cache():
+    report = make_report()
+    # the same report uploaded twice and split by two separate imports
+    s3 = FakeS3({
+        ("reports", "first/processing/section3_nc.pdf"): split_section(report, [(1, 3), (4, 5)]),
+        ("reports", "second/processing/section3_nc.pdf"): split_section(report, [(1, 3), (4, 5)]),
+    })
+    cache = TextractCache(s3_client=s3)
+    calls = []
+
+    def analyse():
+        calls.append(1)
+        return {"Blocks": [{"Id": "1"}]}
+
+    cache.analyse("s3://reports/first/processing/section3_nc.pdf", ["TABLES", "FORMS"], analyse)
+    cache.analyse("s3://reports/second/processing/section3_nc.pdf", ["TABLES", "FORMS"], analyse)
+
+    assert len(calls) == 1
+
+
+def test_analyse_caches_by_content_and_features():
+    section = split_section(make_report(), [(0, 2)])
+    s3 = FakeS3({("reports", "a/section.pdf"): section, ("reports", "b/section.pdf"): section})
+    cache = TextractCache(s3_client=s3)
+    calls = []
+
+    def analyse():
+        calls.append(1)
+        return {"Blocks": [{"Id": "1"}]}
+
+    first = cache.analyse("s3://reports/a/section.pdf", ["TABLES", "FORMS"], analyse)
+    # same bytes uploaded under another key, features in a different order
+    second = cache.analyse("s3://reports/b/section.pdf", ["FORMS", "TABLES"], analyse)
+
+    assert first == second == {"Blocks": [{"Id": "1"}]}
+    assert len(calls) == 1
+    key = cache.cache_key(section, ["FORMS", "TABLES"])
+    assert json.loads(gzip.decompress(s3.objects[("reports", key)])) == first
+
+
+def test_analyse_misses_on_different_features():
+    s3 = FakeS3({("reports", "section.pdf"): split_section(make_report(), [(0, 2)])})
+    cache = TextractCache(s3_client=s3, bucket="cache")
+    calls = []
+
+    def analyse():
+        calls.append(1)
+        return {"Blocks": []}
+
+    cache.analyse("s3://reports/section.pdf", ["TABLES"], analyse)
+    cache.analyse("s3://reports/section.pdf", ["FORMS", "TABLES"], analyse)
+
+    assert len(calls) == 2
+    assert all(bucket == "cache" for bucket, key in s3.objects if key.startswith("textract-cache/"))
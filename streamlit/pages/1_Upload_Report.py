@@ -12,8 +12,8 @@ import s3fs
 import base64
 import random
 import json
-import ast
 import os
+from concurrent.futures import ThreadPoolExecutor
 from streamlit_cognito_auth import CognitoHostedUIAuthenticator
 from streamlit_cognito_auth.session_provider import Boto3SessionProvider
 from botocore.exceptions import ClientError
@@ -29,6 +29,7 @@ aws_account_id = os.environ["AWS_ACCOUNT_ID"]
 
 report_bucket = os.environ["REPORT_BUCKET"]
 grading_bucket = os.environ["GRADING_BUCKET"]
+status_table = os.environ["STATUS_TABLE"]
 
 
 authenticator = CognitoHostedUIAuthenticator(
@@ -48,8 +49,39 @@ session_provider = Boto3SessionProvider(
 )
 
 s3_client = boto3.client('s3')
+ddb_client = boto3.client('dynamodb')
 s3_uid = str(uuid.uuid4())
 
+# status polling backs off while nothing changes and resets as soon as something does
+STATUS_POLL_INITIAL_SECONDS = 1
+STATUS_POLL_MAX_SECONDS = 8
+FAILED_STATUSES = ("FAILED", "TIMED_OUT", "ABORTED")
+SECTION_FETCH_WORKERS = 8
+# schema of the {section}_nc_data.jsonl files written by get_nc
+NC_COLUMNS = [
+    "Company Name",
+    "Date Of Audit",
+    "Clause",
+    "Issue Number",
+    "Issue Type",
+    "Issue Title",
+    "ESG Rating",
+    "Report Timescale",
+    "ESG Timescale",
+    "Timescales Match",
+    "Exact Issue Title",
+]
+# company, audit and clause are the same on every row of a section tab
+SECTION_COLUMNS = NC_COLUMNS[3:]
+STAGE_LABELS = {
+    "split": "Report split",
+    "supplier": "Supplier details",
+    "nc": "Non-compliance extraction",
+    "validate": "Grading validation",
+    "results": "Section results",
+    "email": "Email",
+}
+
 def sleep_interval():
     return 10
 
@@ -151,16 +183,171 @@ def upload_report_to_s3(file, bucket,s3_file):
             st.error('File not found.')
             return False 
 
-def check_processing_status(s3_uid):
-    data_key = f"{s3_uid}/status/status.txt"
+def get_execution_status(s3_uid):
+    """Read only the status and change counter of the import's execution item"""
+    response = ddb_client.get_item(
+        TableName=status_table,
+        Key={'Import Uid': {'S': s3_uid}, 'Record': {'S': 'execution'}},
+        ProjectionExpression="#status, Version",
+        ExpressionAttributeNames={'#status': 'Status'}
+    )
+    item = response.get('Item', {})
+    return item.get('Status', {}).get('S'), item.get('Version', {}).get('N')
+
+def get_stage_items(s3_uid):
+    response = ddb_client.query(
+        TableName=status_table,
+        KeyConditionExpression="#uid = :uid AND begins_with(#record, :stage)",
+        ExpressionAttributeNames={'#uid': 'Import Uid', '#record': 'Record'},
+        ExpressionAttributeValues={':uid': {'S': s3_uid}, ':stage': {'S': 'stage#'}}
+    )
+    return response.get('Items', [])
+
+def get_stage_progress(stage_items):
+    return [
+        {
+            "Stage": STAGE_LABELS.get(item['Stage']['S'], item['Stage']['S']),
+            "Section": item.get('Section', {}).get('S', ''),
+            "Status": item['Status']['S'],
+            "Duration (s)": int(item['Duration Ms']['N']) / 1000 if 'Duration Ms' in item else None,
+            "Counts": ", ".join(f"{name}: {count['N']}" for name, count in item.get('Counts', {}).get('M', {}).items()),
+            "Updated At": item['Updated At']['S'],
+        }
+        for item in stage_items
+    ]
+
+def get_finished_sections(stage_items):
+    """Sections whose get_nc results have been written"""
+    return {
+        item['Section']['S']
+        for item in stage_items
+        if item['Stage']['S'] == 'results' and item['Status']['S'] == 'completed' and 'Section' in item
+    }
+
+def get_failed_sections(stage_items):
+    """Sections with a failed stage, whose results will not arrive"""
+    return {
+        item['Section']['S']
+        for item in stage_items
+        if item['Status']['S'] == 'failed' and 'Section' in item
+    }
+
+def check_processing_status(s3_uid, progress_placeholder, on_progress=None):
+    """
+    Poll the execution item with exponential backoff until the pipeline finishes,
+    re-reading the stage items only when its Version changes and handing them to
+    on_progress so finished sections can be shown straight away
+    """
+    delay = STATUS_POLL_INITIAL_SECONDS
+    seen_version = None
+    while True:
+        try:
+            status, version = get_execution_status(s3_uid)
+        except ClientError as e:
+            st.error(f"An error occurred while checking status: {str(e)}")
+            return 'error'
+        
+        if version != seen_version:
+            seen_version = version
+            delay = STATUS_POLL_INITIAL_SECONDS
+            stage_items = get_stage_items(s3_uid)
+            if stage_items:
+                progress_placeholder.dataframe(pd.DataFrame(get_stage_progress(stage_items)), hide_index=True)
+                if on_progress:
+                    on_progress(stage_items)
+        else:
+            delay = min(delay * 2, STATUS_POLL_MAX_SECONDS)
+        
+        if status == 'SUCCEEDED':
+            return 'completed'
+        if status in FAILED_STATUSES:
+            return 'error'
+        time.sleep(delay)
+
+def section_name(option):
+    return f"section{option.split('-')[0].lower().strip()}"
+
+def section_data_key(s3_uid, section):
+    return f"{s3_uid}/processing/{section}_nc_data.jsonl"
+
+@st.cache_data(show_spinner=False)
+def load_section_data(s3_uid, section, etag, _body):
+    """Parse a section's results; the ETag stands in for the unhashed body in the cache key"""
+    return read_nc_records(_body)
+
+def read_nc_records(body):
+    """Load get_nc's JSON Lines output into a DataFrame with the NC_COLUMNS schema"""
+    records = (json.loads(line) for line in body.splitlines() if line.strip())
+    return pd.DataFrame.from_records(records, columns=NC_COLUMNS)
+
+def download_section(s3_uid, section, known_etag):
+    """
+    Return (etag, body) for a section's results, with body None when the ETag is
+    still known_etag, or None when they are not there yet. Runs on worker threads,
+    so it only talks to S3 and never to Streamlit.
+    """
+    key = section_data_key(s3_uid, section)
     try:
-        response = s3_client.get_object(Bucket=report_bucket, Key=data_key)
-        return 'completed'
-    except s3_client.exceptions.NoSuchKey:
-        return 'running'
-    except Exception as e:
-        st.error(f"An error occurred while checking status: {str(e)}")
-        return 'error'
+        etag = s3_client.head_object(Bucket=report_bucket, Key=key)['ETag']
+        if etag == known_etag:
+            return etag, None
+        return etag, s3_client.get_object(Bucket=report_bucket, Key=key, IfMatch=etag)["Body"].read()
+    except ClientError:
+        # not written yet, or rewritten between the head and the get; the next poll picks it up
+        return None
+
+def fetch_sections(s3_uid, sections, known_etags):
+    """
+    Download the sections whose results are new or changed since known_etags
+    concurrently, then parse them through the cache on this thread
+    """
+    sections = list(sections)
+    if not sections:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(len(sections), SECTION_FETCH_WORKERS)) as executor:
+        results = list(executor.map(lambda section: download_section(s3_uid, section, known_etags.get(section)), sections))
+    return {
+        section: (result[0], load_section_data(s3_uid, section, result[0], result[1]))
+        for section, result in zip(sections, results)
+        if result and result[1] is not None
+    }
+
+def render_section(s3_uid, section, df, placeholder):
+    with placeholder.container():
+        if df.empty:
+            st.warning('No data found for this section.')
+        else: 
+            st.dataframe(
+            df,
+            column_order=SECTION_COLUMNS,
+            column_config={
+                "Issue Number": st.column_config.NumberColumn("Issue No."),
+                "Timescales Match": st.column_config.CheckboxColumn(),
+                "Exact Issue Title": st.column_config.CheckboxColumn(),
+            },
+            hide_index=True,
+            )
+        
+        with st.expander("Do you want to verify with the report?"):
+            shortened_pdf_key = f"{s3_uid}/processing/{section}_nc.pdf"
+            
+            if check_file_exists(report_bucket, shortened_pdf_key):
+                st.success('File exists')
+                local_pdf_path = f"{section}.pdf"    
+                s3_client.download_file(report_bucket, shortened_pdf_key, local_pdf_path)
+                with open(local_pdf_path,"rb") as f:
+                    base64_pdf = base64.b64encode(f.read()).decode('utf-8')
+            
+                pdf_display = f'<iframe src="data:application/pdf;base64,{base64_pdf}" width="800" height="800" type="application/pdf"></iframe>'
+                st.markdown(pdf_display, unsafe_allow_html=True)
+            else: 
+                st.write('PDF not available yet...')
+
+def render_sections(s3_uid, sections, placeholders, rendered):
+    """Fetch the given sections and draw any whose results are new or changed since last drawn"""
+    for section, (etag, df) in fetch_sections(s3_uid, sections, rendered).items():
+        render_section(s3_uid, section, df, placeholders[section])
+        rendered[section] = etag
         
 def check_file_exists(bucket, key):
     try:
@@ -267,59 +454,40 @@ if st.session_state['authenticated']:
             
         if options: 
             
+            progress_placeholder = st.empty()
+            sections = [section_name(option) for option in options]
+            tabs = st.tabs(options)
+            placeholders = {}
+            for section, tab in zip(sections, tabs):
+                with tab:
+                    placeholders[section] = st.empty()
+                    placeholders[section].info('Still processing this section...')
+            rendered = {}
+            failed = set()
+            
+            def show_finished_sections(stage_items):
+                render_sections(s3_uid, get_finished_sections(stage_items) - rendered.keys(), placeholders, rendered)
+                for section in get_failed_sections(stage_items) - failed - rendered.keys():
+                    if section in placeholders:
+                        failed.add(section)
+                        placeholders[section].error('Processing failed for this section.')
+            
             with st.spinner('Reading report...Come back in a minute or two'):
-                status = 'running'
-                while status == 'running':
-                    status = check_processing_status(s3_uid)
-                    if status == 'running':
-                        # Sleep to prevent excessive API calls while polling for status
-                        time.sleep(sleep_interval())  #Wait for 10 seconds before checking again 
+                status = check_processing_status(s3_uid, progress_placeholder, on_progress=show_finished_sections)
             
             if status == 'completed':
                     st.success('Processing completed successfully!')
             else:
                 st.error('Processing failed.')
             
-            tabs = st.tabs(options)
+            # pick up anything the stage records did not announce
+            render_sections(s3_uid, sections, placeholders, rendered)
             
-            for i, tab in enumerate(tabs):
+            for section, tab in zip(sections, tabs):
                 
                 with tab:   
-                    current_section_name = f"section{options[i].split('-')[0].lower().strip()}"
-                    data_key = f"{s3_uid}/processing/{current_section_name}_nc_data.txt"
-                    # try:
-                    response = s3_client.get_object(Bucket=report_bucket, Key=data_key)
-                    content = response["Body"].read().decode("utf-8")
-                    data = ast.literal_eval(content)
-                    
-                    df = pd.DataFrame(data)
-                    
-                    if df.empty:
-                        st.warning('No data found for this section.')
-                    else: 
-                        st.dataframe(
-                        df,
-                        column_config={
-                            "name": "Company Name",
-                            "date": "Audit Date",
-                        },
-                        hide_index=True,
-                        )
-                    
-                    with st.expander("Do you want to verify with the report?"):
-                        shortened_pdf_key = f"{s3_uid}/processing/{current_section_name}_nc.pdf"
-                        
-                        if check_file_exists(report_bucket, shortened_pdf_key):
-                            st.success('File exists')
-                            local_pdf_path = f"{current_section_name}_{i}.pdf"    
-                            s3_client.download_file(report_bucket, shortened_pdf_key, local_pdf_path)
-                            with open(local_pdf_path,"rb") as f:
-                                base64_pdf = base64.b64encode(f.read()).decode('utf-8')
-                        
-                            pdf_display = f'<iframe src="data:application/pdf;base64,{base64_pdf}" width="800" height="800" type="application/pdf"></iframe>'
-                            st.markdown(pdf_display, unsafe_allow_html=True)
-                        else: 
-                            st.write('PDF not available yet...')
+                    if section not in rendered and section not in failed:
+                        placeholders[section].warning('No results available for this section.')
                     
                     with st.expander("Do you want to view the email?"):
                         shortened_email_key = f"{s3_uid}/email/email.txt"